@@ -1,191 +1,499 @@
 import logging
 import sqlite3
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List
+
+import changes
+import metrics
+import notify
+import profiler
+import rules
 
 LOGGER = logging.getLogger("meteofetch.alerts")
 
+ALERT_EVAL_SECONDS = metrics.histogram("meteofetch_alert_eval_seconds", "Czas analizy alertów", ("source",))
+ALERTS_DETECTED = metrics.counter("meteofetch_alerts_detected", "Wykryte bloki alertów")
+ALERTS_INSERTED = metrics.counter("meteofetch_alerts_inserted", "Nowe alerty zapisane w DB")
+ALERT_BLOCKS = metrics.counter("meteofetch_alert_blocks", "Zmiany zapisanych bloków alertów (analiza przyrostowa)",
+                               ("change",))
+ALERT_EVAL_HOURS = metrics.counter("meteofetch_alert_eval_hours", "Godziny ocenione przez analizę przyrostową")
+
 # nowe progi zgodnie z wymaganiem
 ALERT_TEMP_LOW_THRESHOLD = -15.0   # temp < -5°C
 ALERT_WIND_THRESHOLD = 35.0        # wiatr > 10 m/s
 ALERT_WEATHER_CODES_PRECIP = {51,53,55,61,63,65,80,81,82,95}
+# wartości domyślne — przywracane, gdy klucza zabraknie w konfiguracji (configure_alerts)
+_DEFAULT_THRESHOLDS = (ALERT_TEMP_LOW_THRESHOLD, ALERT_WIND_THRESHOLD, frozenset(ALERT_WEATHER_CODES_PRECIP))
+
+
+def configure_thresholds(temp_low: float | None = None, wind: float | None = None,
+                         precip_codes: Iterable[int] | None = None) -> None:
+    """Podmień progi alertów w locie (np. po przeładowaniu konfiguracji demona).
+
+    Funkcje analizy czytają stałe modułu przy każdym wywołaniu, więc zmiana działa
+    od następnej analizy bez restartu.
+    """
+    global ALERT_TEMP_LOW_THRESHOLD, ALERT_WIND_THRESHOLD, ALERT_WEATHER_CODES_PRECIP
+    if temp_low is not None:
+        ALERT_TEMP_LOW_THRESHOLD = float(temp_low)
+    if wind is not None:
+        ALERT_WIND_THRESHOLD = float(wind)
+    if precip_codes is not None:
+        ALERT_WEATHER_CODES_PRECIP = {int(c) for c in precip_codes}
+
+_custom_rules: rules.RuleSet | None = None
+_default_rules: tuple | None = None   # (klucz progów, RuleSet)
+
+
+def configure_rules(specs: Iterable[Dict[str, Any]] | None) -> None:
+    """Ustaw własne reguły (sekcja "alerts.rules" konfiguracji); None/[] = reguły domyślne z progów.
+
+    Reguły są kompilowane tutaj, raz — błędna definicja zgłasza rules.RuleError.
+    """
+    global _custom_rules
+    specs = list(specs or [])
+    _custom_rules = rules.compile_rules(specs) if specs else None
+
+
+def configure_alerts(section: Dict[str, Any] | None) -> None:
+    """Zastosuj całą sekcję "alerts" konfiguracji (temp_low, wind, precip_codes, rules) naraz.
+
+    Najpierw wszystko jest parsowane i sprawdzane — błąd (ValueError, rules.RuleError) nie
+    zmienia niczego — a dopiero potem przypisywane razem. Brakujący klucz (np. usunięty
+    "wind") oznacza wartość domyślną, a nie poprzednią.
+    """
+    global ALERT_TEMP_LOW_THRESHOLD, ALERT_WIND_THRESHOLD, ALERT_WEATHER_CODES_PRECIP, _custom_rules
+    a = section or {}
+    temp_low, wind, codes = _DEFAULT_THRESHOLDS
+    try:
+        if a.get("temp_low") is not None:
+            temp_low = float(a["temp_low"])
+        if a.get("wind") is not None:
+            wind = float(a["wind"])
+        if a.get("precip_codes") is not None:
+            codes = frozenset(int(c) for c in a["precip_codes"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Nieprawidłowy próg alertu w konfiguracji: {e}") from e
+    specs = list(a.get("rules") or [])
+    custom = rules.compile_rules(specs) if specs else None
+    ALERT_TEMP_LOW_THRESHOLD, ALERT_WIND_THRESHOLD = temp_low, wind
+    ALERT_WEATHER_CODES_PRECIP = set(codes)
+    _custom_rules = custom
+
+
+def active_rules() -> rules.RuleSet:
+    """Aktualny zestaw reguł; domyślny jest kompilowany ponownie tylko po zmianie progów."""
+    global _default_rules
+    if _custom_rules is not None:
+        return _custom_rules
+    key = (ALERT_TEMP_LOW_THRESHOLD, ALERT_WIND_THRESHOLD, frozenset(ALERT_WEATHER_CODES_PRECIP))
+    if _default_rules is None or _default_rules[0] != key:
+        _default_rules = (key, rules.compile_rules(rules.default_rule_specs(*key)))
+    return _default_rules[1]
+
+def _flag_runs(any_flag: List[bool]) -> List[tuple]:
+    """Bloki (start, koniec) kolejnych godzin z any_flag True."""
+    blocks = []
+    cur_block = None
+    for i, f in enumerate(any_flag):
+        if f:
+            if cur_block is None:
+                cur_block = [i, i]
+            else:
+                cur_block[1] = i
+        else:
+            if cur_block is not None:
+                blocks.append((cur_block[0], cur_block[1]))
+                cur_block = None
+    if cur_block is not None:
+        blocks.append((cur_block[0], cur_block[1]))
+    return blocks
+
 
-def insert_alert_db(conn: sqlite3.Connection, location_id: int, timestamp: str | None,
-                    metric: str, value: float, message: str, origin: str | None = None) -> int:
+def _describe_block(location_name: str | None, cols: Dict[str, list], flags: List[List[bool]],
+                    ruleset: rules.RuleSet, start_i: int, end_i: int,
+                    start_ts: str | None = None) -> tuple[str, float] | None:
+    """Komunikat i wartość reprezentatywna bloku; None, gdy żadna reguła nie daje treści.
+
+    `start_ts` nadpisuje początek bloku w komunikacie (blok trwający od przed horyzontu).
+    """
+    parts = []
+    rep_value = None
+    # wartości zmiennej raportu z godzin, w których dana reguła była spełniona
+    for rule, rule_flags in zip(ruleset.rules, flags):
+        idx = [j for j in range(start_i, end_i + 1) if rule_flags[j]]
+        if not idx:
+            continue
+        value = rule.summarize(cols, idx)
+        part = rule.render(value)
+        if part is None:
+            continue
+        parts.append(part)
+        if value is not None:
+            rep_value = value if rep_value is None else max(rep_value, value)
+
+    if not parts:
+        return None
+
+    start_ts = start_ts or cols["time"][start_i]
+    end_ts = cols["time"][end_i]
     try:
-        if origin is None:
-            origin = "detected"
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT OR IGNORE INTO alerts (location_id, timestamp, metric, value, message, origin) VALUES (?, ?, ?, ?, ?, ?)",
-            (location_id, timestamp, metric, value, message, origin)
-        )
-        conn.commit()
-        return 1 if cur.lastrowid else 0
+        sd = datetime.fromisoformat(start_ts.replace("Z", "+00:00"))
+        ed = datetime.fromisoformat(end_ts.replace("Z", "+00:00"))
+        if sd.date() != ed.date():
+            time_str = f"od {sd.date()} do {ed.date()}"
+        else:
+            time_str = f"od {sd.strftime('%Y-%m-%d %H:%M')} do {ed.strftime('%Y-%m-%d %H:%M')}"
     except Exception:
-        LOGGER.exception("Nie udało się zapisać alertu do DB")
-        return 0
+        time_str = f"od {start_ts} do {end_ts}"
+
+    mountain_str = f"Góra: {location_name} — " if location_name else ""
+    return f"{mountain_str}W okresie {time_str} wystąpi: " + ", ".join(parts), float(rep_value or 0.0)
+
+
+def _notify_alert(location_id: int, location_name: str | None, start_ts: str, end_ts: str,
+                  value: float, message: str, change: str = "new") -> None:
+    LOGGER.warning("ALERT (loc=%s name=%s): %s", location_id, location_name, message)
+    notify.submit({"location_id": location_id, "location_name": location_name,
+                   "start": start_ts, "end": end_ts, "metric": "combined",
+                   "value": value, "message": message, "change": change})
+
 
 def analyze_payload_and_alert(conn: sqlite3.Connection, location_id: int, payload: Dict[str, Any],
                               location_name: str | None = None, horizon_days: int = 2) -> int:
     """
-    Generuje alerty jeśli w okresie horizon_days wystąpi:
-      - temperatura < -18°C
-      - wiatr > 50 m/s
+    Generuje alerty wg aktywnych reguł (active_rules()) w okresie horizon_days; domyślnie:
+      - temperatura < ALERT_TEMP_LOW_THRESHOLD
+      - wiatr > ALERT_WIND_THRESHOLD
       - opady deszczu/śniegu (rain>0 lub snowfall>0 lub odpowiedni weathercode)
-    Alerty są konsolidowane w bloki godzinowe i zapisywane w tabeli alerts.
+    Dane pochodzą z payloadu (bez zapisu do hourly); bloki godzinowe są scalane z zapisanymi
+    w tabeli alerts tak jak w analizie przyrostowej (_reconcile). Zwraca liczbę nowych alertów.
     Komunikat zawiera nazwę góry (location_name) jeśli dostępna.
     """
-    added = 0
+    t0 = time.perf_counter()
+    notes: List[tuple] = []
     try:
         hourly = payload.get("hourly", {})
-        times = hourly.get("time", [])
-        if not times:
+        cols = rules.to_columns(hourly.get("time", []), hourly.get("temperature_2m", []), hourly.get("rain", []),
+                                hourly.get("snowfall", []), hourly.get("wind_speed_10m", []),
+                                hourly.get("weathercode", []) or hourly.get("weather_code", []))
+        now = datetime.utcnow().replace(microsecond=0)
+        horizon = (now, now + timedelta(days=horizon_days))
+        # tylko godziny horyzontu — jak przy odczycie z bazy (_load_windows)
+        keep = [i for i, t in enumerate(cols["time"]) if (dt := _ts_dt(t)) is not None and horizon[0] < dt <= horizon[1]]
+        if not keep:
             return 0
-
-        temps = hourly.get("temperature_2m", [])
-        rains = hourly.get("rain", [])
-        snows = hourly.get("snowfall", [])
-        winds = hourly.get("wind_speed_10m", [])
-        codes = hourly.get("weathercode", []) or hourly.get("weather_code", [])
-
-        now = datetime.utcnow()
-        max_dt = now + timedelta(days=horizon_days)
-
-        flags = []
-        temp_flag = []
-        wind_flag = []
-        precip_flag = []
-
-        for i, ts in enumerate(times):
-            try:
-                t_dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            except Exception:
-                t_dt = now
-            if t_dt > max_dt:
-                flags.append(False); temp_flag.append(False); wind_flag.append(False); precip_flag.append(False); continue
-
-            t = temps[i] if i < len(temps) else None
-            r = rains[i] if i < len(rains) else 0
-            s = snows[i] if i < len(snows) else 0
-            w = winds[i] if i < len(winds) else None
-            c = codes[i] if i < len(codes) else None
-
-            cond_t = (t is not None and float(t) < ALERT_TEMP_LOW_THRESHOLD)
-            cond_w = (w is not None and float(w) > ALERT_WIND_THRESHOLD)  # strict >
-            cond_p = False
-            try:
-                if (r is not None and float(r) > 0) or (s is not None and float(s) > 0):
-                    cond_p = True
-                if c is not None:
-                    try:
-                        if int(c) in ALERT_WEATHER_CODES_PRECIP:
-                            cond_p = True
-                    except Exception:
-                        pass
-            except Exception:
-                cond_p = False
-
-            flags.append(bool(cond_t or cond_w or cond_p))
-            temp_flag.append(bool(cond_t))
-            wind_flag.append(bool(cond_w))
-            precip_flag.append(bool(cond_p))
-
-        # grupowanie kolejnych godzin, gdzie flags True
-        blocks = []
-        cur_block = None
-        for i, f in enumerate(flags):
-            if f:
-                if cur_block is None:
-                    cur_block = [i, i]
-                else:
-                    cur_block[1] = i
-            else:
-                if cur_block is not None:
-                    blocks.append((cur_block[0], cur_block[1]))
-                    cur_block = None
-        if cur_block is not None:
-            blocks.append((cur_block[0], cur_block[1]))
-
-        detected = 0   # licznik wykrytych bloków/alertów (niezależnie od DB)
-        for start_i, end_i in blocks:
-            detected += 1
-            parts = []
-            rep_value = 0.0
-            # zbierz konkretne wartości spełniające warunki w bloku
-            block_temps = [float(temps[j]) for j in range(start_i, end_i+1) if j < len(temps) and temp_flag[j] and temps[j] is not None]
-            block_winds = [float(winds[j]) for j in range(start_i, end_i+1) if j < len(winds) and wind_flag[j] and winds[j] is not None]
-            block_rain = sum([float(rains[j]) for j in range(start_i, end_i+1) if j < len(rains) and precip_flag[j] and rains[j] is not None])
-            block_snow = sum([float(snows[j]) for j in range(start_i, end_i+1) if j < len(snows) and precip_flag[j] and snows[j] is not None])
-
-            if block_temps:
-                parts.append(f"temperatura do {min(block_temps):.0f}°C")
-                rep_value = min(block_temps)
-            if block_winds:
-                parts.append(f"wiatr do {max(block_winds):.0f} m/s")
-                rep_value = max(rep_value, max(block_winds))
-            if block_rain > 0 or block_snow > 0:
-                parts.append("opady (deszcz/śnieg)")
-                rep_value = max(rep_value, float(block_rain + block_snow))
-
-            if not parts:
-                continue
-
-            start_ts = times[start_i]
-            end_ts = times[end_i]
-            try:
-                sd = datetime.fromisoformat(start_ts.replace("Z", "+00:00"))
-                ed = datetime.fromisoformat(end_ts.replace("Z", "+00:00"))
-                if sd.date() != ed.date():
-                    time_str = f"od {sd.date()} do {ed.date()}"
-                else:
-                    time_str = f"od {sd.strftime('%Y-%m-%d %H:%M')} do {ed.strftime('%Y-%m-%d %H:%M')}"
-            except Exception:
-                time_str = f"od {start_ts} do {end_ts}"
-
-            mountain_str = f"Góra: {location_name} — " if location_name else ""
-            message = f"{mountain_str}W okresie {time_str} wystąpi: " + ", ".join(parts)
-
-            # ZAWSZE powiadom (log/print). Zapis do DB wykona się tylko jeśli alert jeszcze nie istnieje.
-            LOGGER.warning("ALERT (loc=%s name=%s): %s", location_id, location_name, message)
-            print(f"[ALERT] {message}")
-            try:
-                inserted = insert_alert_db(conn, location_id, start_ts, "combined", float(rep_value or 0.0), message)
-                if not inserted:
-                    LOGGER.debug("Alert już istniał (loc=%s name=%s): %s", location_id, location_name, message)
-                added += inserted
-            except Exception:
-                LOGGER.exception("Błąd przy wstawianiu alertu")
-
-        # dodatkowy log: ile wykryto, ile faktycznie wstawiono nowych
-        LOGGER.info("Dla location_id=%s wykryto alertów: %d, wstawiono nowych: %d", location_id, detected, added)
-        print(f"[ALERT SUMMARY] location_id={location_id} wykryto={detected} nowe_wstawione={added}")
-
-        return added
+        cols = {k: [v[i] for i in keep] for k, v in cols.items()}
+        ruleset = active_rules()
+        flags = ruleset.evaluate(cols, location_id)
+        olds = _open_blocks(conn, [location_id], horizon[0] - HOUR).get(location_id, [])
+        # cały payload to nowe dane — wydłużenie bloku jest zgłaszane
+        added = _reconcile(conn, location_id, location_name, cols, flags, (0, len(keep) - 1), True, olds,
+                           ruleset, notes, [_ts_dt(t) for t in cols["time"]])
+        with profiler.stage("alert_commit"):
+            conn.commit()
     except Exception:
         LOGGER.exception("Błąd w analyze_payload_and_alert")
+        conn.rollback()
+        return 0
+    else:
+        for note in notes:
+            _notify_alert(*note)
         return added
+    finally:
+        ALERT_EVAL_SECONDS.observe(time.perf_counter() - t0, source="payload")
 
-def analyze_db_and_alert(conn: sqlite3.Connection, location_id: int, location_name: str | None = None, horizon_days: int = 2) -> int:
+
+# --- analiza przyrostowa ---
+# Zamiast całego horyzontu oceniamy tylko godziny zmienione przez ostatni ingest (changes.py, alert_dirty)
+# z otoczeniem wynikającym z reguł (context_hours), poszerzone o przylegające zapisane bloki.
+# Wynik scalamy z otwartymi blokami w tabeli alerts: blok może się wydłużyć, skrócić,
+# podzielić (druga część = nowy alert) albo zostać zamknięty (closed_at), gdy prognoza
+# przestała go przewidywać. Koniec horyzontu przesuwa się z czasem — godziny, które do niego
+# weszły od ostatniej oceny, traktujemy jak zmienione.
+
+HOUR = timedelta(hours=1)
+_WINDOW_GROW = timedelta(hours=24)   # poszerzenie okna, gdy blok wychodzi poza jego brzeg
+
+
+def _ts_dt(ts: str | None) -> datetime | None:
     try:
-        cur = conn.cursor()
-        now = datetime.utcnow().replace(microsecond=0)
-        max_dt = now + timedelta(days=horizon_days)
-        cur.execute(
-            "SELECT timestamp, temperature, rain, snowfall, wind_speed, weather_code FROM hourly WHERE location_id=? AND timestamp>? AND timestamp<=? ORDER BY timestamp ASC",
-            (location_id, now.isoformat() + "Z", max_dt.isoformat() + "Z")
-        )
-        rows = cur.fetchall()
-        if not rows:
+        return datetime.fromisoformat(ts.replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        return None
+
+
+def _dt_ts(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M")
+
+
+def _dirty_ranges(changed: List[str], gap_hours: int) -> List[tuple]:
+    """Zmienione godziny -> zakresy (od, do); godziny bliżej niż gap_hours łączymy w jeden zakres."""
+    out: List[list] = []
+    for dt in sorted(d for d in map(_ts_dt, changed) if d is not None):
+        if out and dt - out[-1][1] <= timedelta(hours=gap_hours):
+            out[-1][1] = dt
+        else:
+            out.append([dt, dt])
+    return [tuple(r) for r in out]
+
+
+_BATCH = 200   # lokalizacji/okien na jedno zapytanie (limit parametrów SQLite)
+
+
+def _chunks(items: List[Any], n: int = _BATCH) -> Iterable[List[Any]]:
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
+
+def _load_state(conn: sqlite3.Connection, location_ids: List[int]) -> Dict[int, tuple]:
+    """alert_state wszystkich lokalizacji: location_id -> (evaluated_until, rules_signature)."""
+    out: Dict[int, tuple] = {}
+    for chunk in _chunks(location_ids):
+        cur = conn.execute(f"SELECT location_id, evaluated_until, rules_signature FROM alert_state "
+                           f"WHERE location_id IN ({','.join('?' * len(chunk))})", chunk)
+        out.update((r[0], r[1:]) for r in cur.fetchall())
+    return out
+
+
+def _open_blocks(conn: sqlite3.Connection, location_ids: List[int], since: datetime) -> Dict[int, List[tuple]]:
+    """Otwarte bloki (id, start, koniec, komunikat) kończące się nie wcześniej niż `since`, per lokalizacja."""
+    out: Dict[int, List[tuple]] = {}
+    for chunk in _chunks(location_ids):
+        cur = conn.execute(
+            f"SELECT location_id, id, timestamp, end_timestamp, message FROM alerts "
+            f"WHERE location_id IN ({','.join('?' * len(chunk))}) AND metric='combined' AND closed_at IS NULL "
+            f"AND end_timestamp IS NOT NULL AND end_timestamp>=? ORDER BY timestamp", (*chunk, _dt_ts(since)))
+        for r in cur.fetchall():
+            if _ts_dt(r[2]) is not None and _ts_dt(r[3]) is not None:
+                out.setdefault(r[0], []).append(r[1:])
+    return out
+
+
+def _cover_blocks(windows: List[tuple], blocks: List[tuple]) -> List[tuple]:
+    """Okna poszerzone o bloki, które na nie nachodzą albo do nich przylegają, i scalone, gdy się stykają.
+
+    Po tym każdy zapisany blok należy do najwyżej jednego okna, więc okna jednej lokalizacji
+    można scalać z blokami niezależnie (w pamięci, bez ponownego odczytu alerts).
+    """
+    spans = [(_ts_dt(b[1]), _ts_dt(b[2])) for b in blocks]
+    windows = sorted(windows)
+    while True:
+        grown = []
+        for ws, we in windows:
+            for bs, be in spans:
+                if be >= ws - HOUR and bs <= we + HOUR:
+                    ws, we = min(ws, bs), max(we, be)
+            grown.append((ws, we))
+        merged: List[tuple] = []
+        for ws, we in sorted(grown):
+            if merged and ws <= merged[-1][1] + HOUR:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], we))
+            else:
+                merged.append((ws, we))
+        if merged == windows:
+            return merged
+        windows = merged
+
+
+def _load_windows(conn: sqlite3.Connection, specs: List[tuple], horizon: tuple) -> List[Dict[str, list]]:
+    """Dane godzinowe okien (location_id, od, do) przyciętych do horyzontu — jedno zapytanie na paczkę okien."""
+    rows: List[list] = [[] for _ in specs]
+    for base in range(0, len(specs), _BATCH):
+        chunk = specs[base:base + _BATCH]
+        params: List[Any] = []
+        for k, (loc, lo, hi) in enumerate(chunk, start=base):
+            params += [k, loc, _dt_ts(lo), _dt_ts(hi)]
+        cur = conn.execute(
+            f"WITH w(k, loc, lo, hi) AS (VALUES {','.join(['(?, ?, ?, ?)'] * len(chunk))}) "
+            "SELECT w.k, h.timestamp, h.temperature, h.rain, h.snowfall, h.wind_speed, h.weather_code "
+            "FROM w JOIN hourly h ON h.location_id=w.loc AND h.timestamp>=w.lo AND h.timestamp<=w.hi "
+            "WHERE h.timestamp>? AND h.timestamp<=? ORDER BY w.k, h.timestamp",
+            (*params, horizon[0].isoformat() + "Z", horizon[1].isoformat() + "Z"))
+        for r in cur.fetchall():
+            rows[r[0]].append(r[1:])
+    return [rules.to_columns(*([r[i] for r in rs] for i in range(6))) for rs in rows]
+
+
+def _window_bounds(cols: Dict[str, list], any_flag: List[bool], ws: datetime, we: datetime) -> tuple:
+    """(pierwszy, ostatni) indeks godzin okna w danych; None — okno puste;
+    ("grow", ws, we) — blok przechodzi przez brzeg okna (np. godziny z pustym komunikatem, bez zapisu)."""
+    inside = [i for i, t in enumerate(cols["time"]) if (dt := _ts_dt(t)) is not None and ws <= dt <= we]
+    if not inside:
+        return None
+    first, last = inside[0], inside[-1]
+    if first > 0 and any_flag[first - 1] and any_flag[first]:
+        return ("grow", ws - _WINDOW_GROW, we)
+    if last + 1 < len(any_flag) and any_flag[last + 1] and any_flag[last]:
+        return ("grow", ws, we + _WINDOW_GROW)
+    return first, last
+
+
+def _reconcile(conn: sqlite3.Connection, location_id: int, location_name: str | None,
+               cols: Dict[str, list], flags: List[List[bool]], bounds: tuple, from_horizon_start: bool,
+               olds: List[tuple], ruleset: rules.RuleSet, notes: List[tuple], dirty: List[datetime],
+               initial: bool = False) -> int:
+    """Scal wynik oceny okna (godziny `bounds` w `cols`) z zapisanymi blokami `olds`; zwraca liczbę nowych alertów.
+
+    Powiadomienia trafiają do `notes` — wysyła je analyze_changes dopiero po commicie. Wydłużenie
+    bloku zgłaszamy tylko wtedy, gdy wynika ze zmienionych danych (`dirty` z otoczeniem reguł),
+    a nie z samego przesunięcia końca horyzontu.
+
+    `initial` — pierwsza ocena lokalizacji: zapisane bloki pochodzą sprzed analizy przyrostowej
+    (koniec = początek, patrz Api._ensure_db), więc ich rozciągnięcie nie jest zmianą do zgłoszenia.
+    """
+    first, last = bounds
+    any_flag = [any(t) for t in zip(*flags)] if flags else []
+    reach = ruleset.context_hours * HOUR
+
+    def from_data(lo: str, hi: str) -> bool:
+        lo_dt, hi_dt = _ts_dt(lo) - reach, _ts_dt(hi) + reach
+        return any(lo_dt <= d <= hi_dt for d in dirty)
+
+    added = 0
+    used = set()
+    now = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    for si, ei in _flag_runs(any_flag[first:last + 1]):
+        si, ei = si + first, ei + first
+        start_ts, end_ts = cols["time"][si], cols["time"][ei]
+        match = next((b for b in olds if b[0] not in used and b[1] <= end_ts and b[2] >= start_ts), None)
+        # blok trwający od przed początku horyzontu zachowuje swój początek
+        if match is not None and si == 0 and from_horizon_start and match[1] < start_ts:
+            start_ts = match[1]
+        block = _describe_block(location_name, cols, flags, ruleset, si, ei, start_ts=start_ts)
+        ALERTS_DETECTED.inc()
+        if block is None:
+            continue
+        message, value = block
+        if match is None:
+            # nachodzący otwarty blok byłby w `olds`, więc bez osobnego sprawdzania duplikatu
+            with profiler.stage("alert_commit"):
+                conn.execute("INSERT INTO alerts (location_id, timestamp, end_timestamp, metric, value, message, origin) "
+                             "VALUES (?, ?, ?, 'combined', ?, ?, 'detected')",
+                             (location_id, start_ts, end_ts, value, message))
+            notes.append((location_id, location_name, start_ts, end_ts, value, message, "new"))
+            ALERT_BLOCKS.inc(change="new")
+            added += 1
+            continue
+        used.add(match[0])
+        if (match[1], match[2], match[3]) == (start_ts, end_ts, message):
+            continue
+        with profiler.stage("alert_commit"):
+            conn.execute("UPDATE alerts SET timestamp=?, end_timestamp=?, value=?, message=? WHERE id=?",
+                         (start_ts, end_ts, value, message, match[0]))
+        if start_ts < match[1] or end_ts > match[2]:
+            ALERT_BLOCKS.inc(change="extended")
+            if not initial and ((start_ts < match[1] and from_data(start_ts, match[1]))
+                                or (end_ts > match[2] and from_data(match[2], end_ts))):
+                notes.append((location_id, location_name, start_ts, end_ts, value, message, "extended"))
+            else:
+                LOGGER.info("Wydłużono alert (loc=%s name=%s): %s", location_id, location_name, message)
+        else:
+            ALERT_BLOCKS.inc(change="updated")
+            LOGGER.info("Zaktualizowano alert (loc=%s name=%s): %s", location_id, location_name, message)
+    for b in olds:
+        if b[0] in used:
+            continue
+        with profiler.stage("alert_commit"):
+            conn.execute("UPDATE alerts SET closed_at=? WHERE id=?", (now, b[0]))
+        ALERT_BLOCKS.inc(change="closed")
+        LOGGER.info("Alert nieaktualny — zamknięto (loc=%s name=%s): %s", location_id, location_name, b[3])
+    ALERTS_INSERTED.inc(added)
+    return added
+
+
+def analyze_changes(conn: sqlite3.Connection, locations: List[Dict[str, Any]], horizon_days: int = 2,
+                    changed: Dict[int, List[str]] | None = None) -> int:
+    """Przyrostowa analiza alertów po ingeście; zwraca liczbę nowych alertów.
+
+    `changed` (location_id -> zmienione godziny) domyślnie pochodzi z `changes.take()`.
+    Lokalizacja bez zapisanego stanu albo oceniona innymi regułami jest oceniana w całym horyzoncie.
+    Okna wszystkich lokalizacji są ładowane jednym zapytaniem i oceniane jednym przebiegiem
+    (`RuleSet.evaluate_all`); kolejna runda jest potrzebna tylko, gdy blok wychodzi poza okno.
+    Całość (odebrane godziny, bloki, stan) to jedna transakcja: przy błędzie rollback przywraca
+    zmienione godziny do następnej analizy, a powiadomienia nie wychodzą.
+    """
+    t0 = time.perf_counter()
+    total = 0
+    notes: List[tuple] = []
+    try:
+        names = {loc["id"]: loc.get("name") for loc in locations}
+        if not names:
             return 0
-        payload = {"hourly": {"time": [r[0] for r in rows],
-                              "temperature_2m": [r[1] for r in rows],
-                              "rain": [r[2] for r in rows],
-                              "snowfall": [r[3] for r in rows],
-                              "wind_speed_10m": [r[4] for r in rows],
-                              "weathercode": [r[5] for r in rows]}}
-        return analyze_payload_and_alert(conn, location_id, payload, location_name=location_name, horizon_days=horizon_days)
+        if changed is None:
+            changed = changes.take(conn, names)
+        now = datetime.utcnow().replace(microsecond=0)
+        horizon = (now, now + timedelta(days=horizon_days))
+        ruleset = active_rules()
+        ctx = ruleset.context_hours
+        margin = (ctx + 1) * HOUR
+        with profiler.stage("alert_load"):
+            state = _load_state(conn, list(names))
+            blocks = _open_blocks(conn, list(names), horizon[0] - HOUR)
+        pending: Dict[int, List[tuple]] = {}
+        dirty: Dict[int, List[datetime]] = {}
+        for loc in names:
+            row = state.get(loc)
+            until = _ts_dt(row[0]) if row else None
+            dirty[loc] = [d for d in map(_ts_dt, changed.get(loc, [])) if d is not None]
+            if until is None or row[1] != ruleset.signature:
+                ranges = [horizon]
+            else:
+                ranges = _dirty_ranges(changed.get(loc, []), 2 * ctx + 1)
+                if horizon[1] > until:
+                    ranges.append((max(until, horizon[0]), horizon[1]))
+            windows = [(max(a - ctx * HOUR, horizon[0]), min(b + ctx * HOUR, horizon[1])) for a, b in ranges]
+            windows = [w for w in windows if w[0] <= w[1]]
+            if windows:
+                pending[loc] = _cover_blocks(windows, blocks.get(loc, []))
+
+        evaluated = 0
+        while pending:
+            keys = [(loc, ws, we) for loc, ws_list in pending.items() for ws, we in ws_list]
+            specs = [(loc, max(ws - margin, horizon[0]), min(we + margin, horizon[1])) for loc, ws, we in keys]
+            with profiler.stage("alert_load"):
+                data = dict(zip(keys, _load_windows(conn, specs, horizon)))
+            with profiler.stage("alerts"):
+                flags = ruleset.evaluate_all(data, location_of=lambda key: key[0])
+                bounds = {}
+                regrow: Dict[int, List[tuple]] = {}
+                for key, cols in data.items():
+                    f = flags[key]
+                    bounds[key] = _window_bounds(cols, [any(t) for t in zip(*f)] if f else [], key[1], key[2])
+                    if bounds[key] is not None and bounds[key][0] == "grow":
+                        regrow.setdefault(key[0], []).append(bounds[key][1:])
+                # lokalizacja z oknem do poszerzenia idzie w całości do następnej rundy — nic jeszcze nie zapisano
+                for key, spec in zip(keys, specs):
+                    loc = key[0]
+                    if loc in regrow:
+                        if bounds[key] is None or bounds[key][0] != "grow":
+                            regrow[loc].append(key[1:])
+                        continue
+                    evaluated += len(data[key]["time"])
+                    if bounds[key] is None:
+                        continue
+                    olds = [b for b in blocks.get(loc, [])
+                            if _ts_dt(b[2]) >= key[1] - HOUR and _ts_dt(b[1]) <= key[2] + HOUR]
+                    total += _reconcile(conn, loc, names[loc], data[key], flags[key], bounds[key],
+                                        spec[1] == horizon[0], olds, ruleset, notes, dirty[loc],
+                                        initial=state.get(loc) is None)
+            pending = {loc: _cover_blocks(ws_list, blocks.get(loc, [])) for loc, ws_list in regrow.items()}
+
+        conn.executemany("INSERT OR REPLACE INTO alert_state (location_id, evaluated_until, rules_signature) "
+                         "VALUES (?, ?, ?)", [(loc, horizon[1].isoformat() + "Z", ruleset.signature) for loc in names])
+        ALERT_EVAL_HOURS.inc(evaluated)
+        LOGGER.debug("Alerty: ocenione godziny %d dla %d lokalizacji", evaluated, len(names))
+        # jeden commit na wywołanie (bloki i stan wszystkich lokalizacji)
+        with profiler.stage("alert_commit"):
+            conn.commit()
     except Exception:
-        LOGGER.exception("Błąd w analyze_db_and_alert")
+        LOGGER.exception("Błąd w analyze_changes")
+        conn.rollback()
         return 0
-
+    else:
+        for note in notes:
+            _notify_alert(*note)
+        return total
+    finally:
+        ALERT_EVAL_SECONDS.observe(time.perf_counter() - t0, source="incremental")
@@ -1,36 +1,79 @@
-from pathlib import Path
 import os
 import time
 import json
+import hashlib
 import logging
 import sqlite3
-from datetime import datetime
 from typing import List, Dict, Any, Optional
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from http_client import get_client
+
+import changes
+import metrics
+import profiler
+import startup
 
 LOGGER = logging.getLogger("meteofetch.api")
 DB_PATH = os.path.join(os.path.dirname(__file__), "data.db")
 
-# opcjonalny plik config.py zawierający LOCATIONS; format: [{'id':1,'name':'Zugspitze','lat':..., 'lon':...}, ...]
-try:
-    from config import LOCATIONS
-except Exception:
-    LOCATIONS = [
-        {"id": 1, "name": "Zugspitze", "lat": 47.421, "lon": 10.985},
-        {"id": 2, "name": "Grossglockner", "lat": 47.074, "lon": 12.695},
-    ]
+DEFAULT_LOCATIONS = [
+    {"id": 1, "name": "Zugspitze", "lat": 47.421, "lon": 10.985},
+    {"id": 2, "name": "Grossglockner", "lat": 47.074, "lon": 12.695},
+]
+
+FETCH_SECONDS = metrics.histogram("meteofetch_fetch_seconds", "Czas zapytania HTTP do Open-Meteo (bez dekodowania JSON)", ("endpoint",))
+FETCH_DECODE_SECONDS = metrics.histogram("meteofetch_fetch_decode_seconds", "Czas dekodowania JSON odpowiedzi", ("endpoint",))
+FETCH_BYTES = metrics.counter("meteofetch_fetch_bytes", "Pobrane bajty (treść odpowiedzi)", ("endpoint",))
+FETCH_REQUESTS = metrics.counter("meteofetch_fetch_requests", "Zapytania HTTP wg statusu", ("endpoint", "status"))
+STORE_SECONDS = metrics.histogram("meteofetch_store_seconds", "Czas _store_hourly (łącznie z commitem)")
+STORE_COMMIT_SECONDS = metrics.histogram("meteofetch_store_commit_seconds", "Czas commitu w _store_hourly")
+STORE_ROWS = metrics.counter("meteofetch_store_rows", "Przetworzone wiersze hourly (także niezmienione)")
+STORE_ROWS_PER_SECOND = metrics.gauge("meteofetch_store_rows_per_second", "Przepustowość ostatniego _store_hourly")
+
+# adresy API; benchmarki podmieniają je na lokalny serwer zastępczy (benchmarks/stub_server.py)
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 JSON_DIR = os.path.join(DATA_DIR, "json")
-os.makedirs(JSON_DIR, exist_ok=True)
 
-# requests session z prostym retry
-_session = requests.Session()
-_retries = Retry(total=3, backoff_factor=0.6, status_forcelist=(429,500,502,503,504))
-_session.mount("https://", HTTPAdapter(max_retries=_retries))
+# Import modułu nie ma efektów ubocznych: katalogi, sesja HTTP i LOCATIONS z config.py
+# powstają dopiero przy pierwszym użyciu (krótkie uruchomienia z crona nie płacą za to z góry).
+_session = None
+_locations: Optional[List[Dict[str, Any]]] = None
+
+
+def _get_locations() -> List[Dict[str, Any]]:
+    """LOCATIONS z opcjonalnego config.py; format: [{'id':1,'name':'Zugspitze','lat':..., 'lon':...}, ...]"""
+    global _locations
+    if _locations is None:
+        try:
+            from config import LOCATIONS as cfg_locations
+            _locations = cfg_locations
+        except Exception:
+            _locations = DEFAULT_LOCATIONS
+    return _locations
+
+
+def __getattr__(name: str):
+    # `from Api import LOCATIONS` działa jak wcześniej, ale config.py czytamy leniwie
+    if name == "LOCATIONS":
+        return _get_locations()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_session():
+    """requests session z prostym retry — budowana przy pierwszym zapytaniu."""
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.6, status_forcelist=(429,500,502,503,504))
+        adapter = HTTPAdapter(max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
 
 MIN_REQUEST_INTERVAL = 0.5
 _last_request = 0.0
@@ -46,6 +89,9 @@ def _throttle():
 def _ensure_db():
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
+    # WAL: czytelnicy (data_service.py, eksporty) nie blokują zapisu ingestu i odwrotnie;
+    # tryb jest trwały — zapisany w pliku bazy
+    cur.execute("PRAGMA journal_mode=WAL")
     cur.execute("""
     CREATE TABLE IF NOT EXISTS hourly (
         location_id INTEGER,
@@ -68,10 +114,36 @@ def _ensure_db():
         origin TEXT,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )""")
+    # bloki alertów: koniec bloku i zamknięcie (Alert.analyze_changes); migracja starszych baz
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(alerts)")}
+    for col in ("end_timestamp", "closed_at"):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE alerts ADD COLUMN {col} TEXT")
+    # alerty sprzed migracji nie mają końca bloku — bez niego analiza przyrostowa by ich nie
+    # widziała (duplikat i ponowne powiadomienie); blok jednogodzinny zostanie przy pierwszej
+    # ocenie rozciągnięty do faktycznego zakresu albo zamknięty
+    cur.execute("UPDATE alerts SET end_timestamp=timestamp WHERE end_timestamp IS NULL AND timestamp IS NOT NULL")
+    # bloki lokalizacji w zakresie czasu (Alert._open_blocks, data_service /alerts)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_loc_ts ON alerts(location_id, timestamp)")
+    # do jakiej godziny (koniec horyzontu) i jakimi regułami oceniono alerty lokalizacji
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alert_state (
+        location_id INTEGER PRIMARY KEY,
+        evaluated_until TEXT,
+        rules_signature TEXT
+    )""")
+    # godziny zmienione przez ingest, jeszcze nieocenione przez analizę alertów (changes.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alert_dirty (
+        location_id INTEGER,
+        timestamp TEXT,
+        PRIMARY KEY(location_id, timestamp)
+    )""")
     conn.commit()
     conn.close()
 
 def _save_json(name: str, data: Dict[str, Any]) -> str:
+    os.makedirs(JSON_DIR, exist_ok=True)
     path = os.path.join(JSON_DIR, f"{name}.json")
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -79,19 +151,42 @@ def _save_json(name: str, data: Dict[str, Any]) -> str:
 
 def _fetch_open_meteo(lat: float, lon: float, start: Optional[str], end: Optional[str], hourly: List[str]) -> Dict[str, Any]:
     if start and end:
-        url = "https://archive-api.open-meteo.com/v1/archive"
+        url = ARCHIVE_URL
+        endpoint = "archive"
     else:
-        url = "https://api.open-meteo.com/v1/forecast"
+        url = FORECAST_URL
+        endpoint = "forecast"
     params = {"latitude": lat, "longitude": lon, "hourly": ",".join(hourly), "timezone": "UTC"}
     if start and end:
         params["start_date"] = start
         params["end_date"] = end
-    _throttle()
-    r = _session.get(url, params=params, timeout=20)
+    session = _get_session()
+    with profiler.stage("throttle"):
+        _throttle()
+    startup.first_request()
+    t0 = time.perf_counter()
+    try:
+        with profiler.stage("http"):
+            r = session.get(url, params=params, timeout=20)
+    except Exception:
+        FETCH_REQUESTS.inc(endpoint=endpoint, status="error")
+        raise
+    finally:
+        FETCH_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint)
+    FETCH_REQUESTS.inc(endpoint=endpoint, status=str(r.status_code))
+    FETCH_BYTES.inc(len(r.content), endpoint=endpoint)
     r.raise_for_status()
-    return r.json()
+    with FETCH_DECODE_SECONDS.time(endpoint=endpoint), profiler.stage("decode"):
+        return r.json()
 
 def _store_hourly(conn: sqlite3.Connection, location_id: int, payload: Dict[str, Any]) -> int:
+    """Zapisz dane godzinowe; zwraca liczbę przetworzonych wierszy.
+
+    Wiersze identyczne z zapisanymi są pomijane przy zapisie (ale liczą się do przetworzonych
+    i do przepustowości), a godziny faktycznie zmienione trafiają do `changes` (licznik
+    meteofetch_changed_hours) w tej samej transakcji co dane — na tej podstawie
+    Alert.analyze_changes ocenia tylko zmienione okresy.
+    """
     hourly = payload.get("hourly", {})
     times = hourly.get("time", [])
     temps = hourly.get("temperature_2m", [])
@@ -99,42 +194,81 @@ def _store_hourly(conn: sqlite3.Connection, location_id: int, payload: Dict[str,
     snows = hourly.get("snowfall", []) or hourly.get("snow_depth", [])
     winds = hourly.get("wind_speed_10m", [])
     codes = hourly.get("weathercode", []) or hourly.get("weather_code", [])
+    t0 = time.perf_counter()
     cur = conn.cursor()
-    inserted = 0
-    for i, ts in enumerate(times):
-        temp = temps[i] if i < len(temps) else None
-        rain = rains[i] if i < len(rains) else 0.0
-        snow = snows[i] if i < len(snows) else 0.0
-        wind = winds[i] if i < len(winds) else None
-        code = codes[i] if i < len(codes) else None
-        try:
-            cur.execute("""INSERT OR REPLACE INTO hourly
-                (location_id,timestamp,temperature,rain,snowfall,wind_speed,weather_code)
-                VALUES (?,?,?,?,?,?,?)""",
-                (location_id, ts, temp, rain, snow, wind, code))
-            inserted += 1
-        except Exception:
-            LOGGER.exception("Nie udało się zapisać wiersza hourly %s %s", location_id, ts)
-    conn.commit()
-    return inserted
+    processed = 0
+    changed = []
+    with profiler.stage("store"):
+        existing = {}
+        if times:
+            cur.execute("SELECT timestamp, temperature, rain, snowfall, wind_speed, weather_code FROM hourly "
+                        "WHERE location_id=? AND timestamp>=? AND timestamp<=?",
+                        (location_id, min(times), max(times)))
+            existing = {r[0]: r[1:] for r in cur.fetchall()}
+        for i, ts in enumerate(times):
+            temp = temps[i] if i < len(temps) else None
+            rain = rains[i] if i < len(rains) else 0.0
+            snow = snows[i] if i < len(snows) else 0.0
+            wind = winds[i] if i < len(winds) else None
+            code = codes[i] if i < len(codes) else None
+            if existing.get(ts) == (temp, rain, snow, wind, code):
+                processed += 1
+                continue
+            try:
+                cur.execute("""INSERT OR REPLACE INTO hourly
+                    (location_id,timestamp,temperature,rain,snowfall,wind_speed,weather_code)
+                    VALUES (?,?,?,?,?,?,?)""",
+                    (location_id, ts, temp, rain, snow, wind, code))
+                processed += 1
+                changed.append(ts)
+            except Exception:
+                LOGGER.exception("Nie udało się zapisać wiersza hourly %s %s", location_id, ts)
+        changes.record(conn, location_id, changed)
+    with STORE_COMMIT_SECONDS.time(), profiler.stage("store_commit"):
+        conn.commit()
+    elapsed = time.perf_counter() - t0
+    STORE_SECONDS.observe(elapsed)
+    STORE_ROWS.inc(processed)
+    if elapsed > 0:
+        STORE_ROWS_PER_SECOND.set(processed / elapsed)
+    return processed
+
+HOURLY_VARS = ["temperature_2m","rain","snowfall","wind_speed_10m","weathercode"]
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    """Odcisk danych prognozy (blok hourly) — służy do wykrycia, czy model się zmienił.
+
+    `generationtime_ms` to tylko czas generowania odpowiedzi po stronie API (zmienia się
+    przy każdym zapytaniu), więc nie nadaje się jako wersja danych; hashujemy treść.
+    """
+    hourly = payload.get("hourly", {})
+    raw = json.dumps(hourly, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def fetch_location(loc: Dict[str, Any], fetch_hourly: bool = True, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, save_json: bool = False) -> Dict[str, Any]:
+    """Pobierz payload Open-Meteo dla jednej lokalizacji (bez zapisu do DB)."""
+    name = loc.get("name") or str(loc.get("id"))
+    payload = _fetch_open_meteo(loc["lat"], loc["lon"], start_date, end_date, HOURLY_VARS if fetch_hourly else [])
+    if save_json:
+        fname = f"{name}_{start_date or 'now'}_{end_date or ''}_{int(time.time())}"
+        _save_json(fname, payload)
+    return payload
 
 def fetch_and_store_all(fetch_minutely: bool = False, fetch_hourly: bool = True,
                         start_date: Optional[str] = None, end_date: Optional[str] = None,
                         save_json: bool = False, locations: Optional[List[Dict[str,Any]]] = None) -> int:
     _ensure_db()
     if locations is None:
-        locations = LOCATIONS
+        locations = _get_locations()
     total_inserted = 0
     conn = sqlite3.connect(DB_PATH)
     for loc in locations:
         name = loc.get("name") or str(loc.get("id"))
         LOGGER.info("Uruchamiam fetch (hourly=%s, minutely=%s) dla: %s", fetch_hourly, fetch_minutely, name)
         try:
-            hourly_vars = ["temperature_2m","rain","snowfall","wind_speed_10m","weathercode"]
-            payload = _fetch_open_meteo(loc["lat"], loc["lon"], start_date, end_date, hourly_vars if fetch_hourly else [])
-            if save_json:
-                fname = f"{name}_{start_date or 'now'}_{end_date or ''}_{int(time.time())}"
-                _save_json(fname, payload)
+            payload = fetch_location(loc, fetch_hourly=fetch_hourly, start_date=start_date,
+                                     end_date=end_date, save_json=save_json)
             inserted = _store_hourly(conn, loc["id"], payload)
             total_inserted += inserted
         except Exception as e:
@@ -142,7 +276,6 @@ def fetch_and_store_all(fetch_minutely: bool = False, fetch_hourly: bool = True,
     conn.close()
     return total_inserted
 
-
 if __name__ == "__main__":
     # Prosty program: wykonaj jedno pobranie i zakończ.
     inserted = fetch_and_store_all(DB_PATH, fetch_hourly=True, fetch_minutely=True, save_payloads=False)
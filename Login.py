@@ -1,62 +1,189 @@
 from pathlib import Path
+from datetime import datetime, timezone
+import atexit
+import json
 import logging
-import traceback
+import logging.handlers
+import queue
+import threading
 import time
 import sys
+import importlib.util
 from typing import Optional
 
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except Exception:
-    REQUESTS_AVAILABLE = False
+# requests nie jest importowane przy starcie: wyjątek RequestException może wystąpić tylko
+# wtedy, gdy kod, który go rzucił, już zaimportował requests — wystarczy sys.modules.
+REQUESTS_AVAILABLE = importlib.util.find_spec("requests") is not None
+
+
+def _request_exception_type():
+    mod = sys.modules.get("requests")
+    exceptions = getattr(mod, "exceptions", None) if mod is not None else None
+    return getattr(exceptions, "RequestException", None)
+
+
+LOG_QUEUE_SIZE = 10000          # maks. liczba rekordów czekających na zapis
+ERRORS_LOG_MAX_BYTES = 5 * 1024 * 1024
+ERRORS_LOG_BACKUPS = 3
+DEDUP_WINDOW_S = 60.0           # okno ograniczania powtórzeń
+DEDUP_MAX_PER_WINDOW = 5        # tyle identycznych komunikatów przepuszczamy w oknie
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DropQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, który nigdy nie blokuje: przy pełnej kolejce rekord jest odrzucany."""
+
+    def __init__(self, q: "queue.Queue"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            import metrics
+            metrics.counter("meteofetch_log_dropped", "Rekordy logów odrzucone przy pełnej kolejce").inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # traceback formatujemy tu (w wątku wołającym): obiekt wyjątku trzyma ramki stosu
+        # i nie powinien czekać w kolejce; resztę formatowania robi listener
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class DedupFilter(logging.Filter):
+    """Ogranicza powtórzenia: w oknie `window_s` przepuszcza najwyżej `max_per_window`
+    rekordów o tym samym loggerze, poziomie, treści (po podstawieniu argumentów) i typie
+    wyjątku — różne błędy z jednego szablonu nie są sklejane. Pierwszy rekord w nowym
+    oknie dostaje dopisek z liczbą pominiętych."""
+
+    def __init__(self, window_s: float = DEDUP_WINDOW_S, max_per_window: int = DEDUP_MAX_PER_WINDOW):
+        super().__init__()
+        self.window_s = window_s
+        self.max_per_window = max_per_window
+        self._seen: dict = {}   # klucz -> [początek okna, licznik, pominięte]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, record.getMessage(), exc_type)
+        now = time.monotonic()
+        with self._lock:
+            st = self._seen.get(key)
+            if st is None or now - st[0] >= self.window_s:
+                suppressed = st[2] if st else 0
+                self._seen[key] = [now, 1, 0]
+                if len(self._seen) > 1000:
+                    self._prune(now)
+                if suppressed:
+                    record.msg = f"{record.msg} [pominięto {suppressed} podobnych komunikatów]"
+                return True
+            st[1] += 1
+            if st[1] <= self.max_per_window:
+                return True
+            st[2] += 1
+            return False
+
+    def _prune(self, now: float) -> None:
+        for k in [k for k, v in self._seen.items() if now - v[0] >= self.window_s and not v[2]]:
+            del self._seen[k]
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Jeden rekord = jedna linia JSON (czas, poziom, logger, komunikat, traceback)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            doc["exc"] = record.exc_text
+        return json.dumps(doc, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Krótkie komunikaty dla operatora — bez tracebacków (te są w errors.log)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        return self.formatMessage(record)
 
 
 def setup_logger() -> logging.Logger:
-    """Skonfiguruj logger:
-    - stdout: INFO+ (krótkie komunikaty dla operatora),
-    - plik data/errors.log: tylko ERROR+ (tylko wyjątki/błędy).
+    """Skonfiguruj logowanie (loggery "login" i "meteofetch"):
+    - rekordy trafiają do ograniczonej kolejki (DropQueueHandler), a zapis robi osobny
+      wątek (QueueListener) — wątek pobierania nigdy nie czeka na konsolę ani dysk,
+    - stdout: INFO+ (krótkie komunikaty dla operatora, bez tracebacków),
+    - plik data/errors.log: tylko ERROR+, linie JSON z tracebackiem, rotacja wg rozmiaru,
+    - powtarzające się komunikaty są ograniczane (DedupFilter).
     """
+    global _listener
     data_dir = Path("data")
     data_dir.mkdir(parents=True, exist_ok=True)
 
-    logger = logging.getLogger("login")
-    logger.setLevel(logging.INFO)
-
-    # usuń stare handlery, żeby nie duplikować wpisów
-    logger.handlers.clear()
-
-    fmt = logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
-    fh = logging.FileHandler(data_dir / "errors.log", encoding="utf-8")
+    fh = logging.handlers.RotatingFileHandler(data_dir / "errors.log", maxBytes=ERRORS_LOG_MAX_BYTES,
+                                              backupCount=ERRORS_LOG_BACKUPS, encoding="utf-8", delay=True)
     fh.setLevel(logging.ERROR)
-    fh.setFormatter(fmt)
+    fh.setFormatter(JsonLineFormatter())
 
     sh = logging.StreamHandler(sys.stdout)
     sh.setLevel(logging.INFO)
-    sh.setFormatter(fmt)
+    sh.setFormatter(ConsoleFormatter("%(asctime)s %(levelname)s: %(message)s"))
 
-    logger.addHandler(sh)
-    logger.addHandler(fh)
+    q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    qh = DropQueueHandler(q)
+    qh.addFilter(DedupFilter())
+    _listener = logging.handlers.QueueListener(q, sh, fh, respect_handler_level=True)
+    _listener.start()
 
-    # Nie propaguj do root loggera
-    logger.propagate = False
+    for name in ("login", "meteofetch"):
+        lg = logging.getLogger(name)
+        lg.setLevel(logging.INFO)
+        # usuń stare handlery, żeby nie duplikować wpisów
+        lg.handlers.clear()
+        lg.addHandler(qh)
+        # Nie propaguj do root loggera
+        lg.propagate = False
 
-    return logger
+    return logging.getLogger("login")
+
+
+def shutdown_logging() -> None:
+    """Opróżnij kolejkę i zatrzymaj wątek zapisu (wołane też przy wyjściu z procesu)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
 
 
 def log_exception(logger: logging.Logger, exc: Exception, context: str | None = None) -> None:
     """Zapisz wyjątek wraz ze śladem stosu do pliku błędów (ERROR) i poinformuj konsolę.
 
-    Plik błędów będzie zawierać pełny traceback (logger.exception).
-    Konsola dostanie krótki komunikat o błędzie (logger.error).
+    Jeden rekord: konsola pokazuje krótki komunikat, errors.log dostaje go z pełnym tracebackiem.
     """
     if context:
-        logger.error("Błąd w kontekście '%s': %s", context, exc)
+        logger.error("Błąd w kontekście '%s': %s", context, exc, exc_info=exc)
     else:
-        logger.error("Błąd: %s", exc)
-    # pełny ślad stosu zapisany przez logger.exception (trafi do pliku errors.log)
-    logger.exception("Szczegóły wyjątku:")
+        logger.error("Błąd: %s", exc, exc_info=exc)
 
 
 def log_api_exception(logger: logging.Logger, exc: Exception, context: str | None = None) -> None:
@@ -65,13 +192,9 @@ def log_api_exception(logger: logging.Logger, exc: Exception, context: str | Non
     Jeśli to nie jest błąd sieciowy, podajemy normalne log_exception.
     """
     is_api_error = False
-    if REQUESTS_AVAILABLE:
-        try:
-            from requests.exceptions import RequestException
-            if isinstance(exc, RequestException):
-                is_api_error = True
-        except Exception:
-            is_api_error = False
+    request_exc = _request_exception_type()
+    if request_exc is not None and isinstance(exc, request_exc):
+        is_api_error = True
     # dodatkowa heurystyka na podstawie treści wyjątku
     if not is_api_error:
         msg = str(exc).lower()
@@ -80,10 +203,9 @@ def log_api_exception(logger: logging.Logger, exc: Exception, context: str | Non
 
     if is_api_error:
         if context:
-            logger.error("Błąd połączenia z API w kontekście '%s': %s", context, exc)
+            logger.error("Błąd połączenia z API w kontekście '%s': %s", context, exc, exc_info=exc)
         else:
-            logger.error("Błąd połączenia z API: %s", exc)
-        logger.exception("Szczegóły błędu połączenia z API:")
+            logger.error("Błąd połączenia z API: %s", exc, exc_info=exc)
     else:
         # zwykły wyjątek aplikacji
         log_exception(logger, exc, context=context)
@@ -98,7 +220,8 @@ def log_exceptions(fn):
         except Exception as e:
             # jeśli to błąd połączenia z API, oznacz specjalnie
             try:
-                if REQUESTS_AVAILABLE and isinstance(e, getattr(__import__("requests").exceptions, "RequestException")):
+                request_exc = _request_exception_type()
+                if request_exc is not None and isinstance(e, request_exc):
                     log_api_exception(logger, e, context=f"{fn.__name__}")
                 else:
                     # heurystyka: jeśli wyjątek wygląda na błąd sieciowy, użyj log_api_exception
@@ -114,20 +237,32 @@ def log_exceptions(fn):
     return wrapper
 
 
-def timed(logger: logging.Logger, name: str):
-    """Prosty context manager do mierzenia czasu i logowania wyjątków."""
+def timed(logger: logging.Logger, name: str, level: int | None = logging.INFO, histogram=None):
+    """Prosty context manager do mierzenia czasu i logowania wyjątków.
+
+    Czas trafia też do rejestru metryk: domyślnie do histogramu
+    `meteofetch_stage_seconds{stage=name}`, albo do podanego `histogram`.
+    `level=None` wyłącza komunikat "X took Ys" (np. na gorących ścieżkach).
+    """
+    import metrics
+
     class _Timer:
         def __enter__(self):
-            self.start = time.time()
+            self.start = time.perf_counter()
             return self
 
         def __exit__(self, exc_type, exc, tb):
-            elapsed = time.time() - self.start
+            self.elapsed = time.perf_counter() - self.start
+            if histogram is not None:
+                histogram.observe(self.elapsed)
+            else:
+                metrics.STAGE_SECONDS.observe(self.elapsed, stage=name)
             if exc:
                 # logujemy wyjątek jako error
                 log_exception(logger, exc, context=name)
                 return False
-            logger.info("%s took %.3fs", name, elapsed)
+            if level is not None:
+                logger.log(level, "%s took %.3fs", name, self.elapsed)
             return False
 
     return _Timer()
@@ -1,9 +1,8 @@
-from pathlib import Path
-import logging, sqlite3, time, argparse
-from Api import fetch_and_store_all, DB_PATH, LOCATIONS
+import startup
+startup.mark_start()
+
+import logging, argparse
 from Login import setup_logger, log_exception
-from backup_db import backup_db
-import Alert
 
 
 def _yes(ans: str) -> bool:
@@ -17,26 +16,87 @@ def main():
 
     p = argparse.ArgumentParser()
     p.add_argument("--once", action="store_true")
-    p.add_argument("--interval", type=int, default=15, help="minuty")
+    p.add_argument("--interval", type=int, default=None, help="minuty (domyślnie 15)")
     p.add_argument("--start-date", type=str, default=None, help="YYYY-MM-DD — jeśli ustawione pobierze dane historyczne (archive). Domyślnie: prognoza")
     p.add_argument("--end-date", type=str, default=None, help="YYYY-MM-DD — koniec zakresu (używane z --start-date)")
+    p.add_argument("--daemon", action="store_true", help="tryb demona: bez pytań, konfiguracja z pliku (--config)")
+    p.add_argument("--config", type=str, default=None, help="plik konfiguracyjny JSON (patrz meteofetch.example.json); z --once wyłącza pytania")
+    p.add_argument("--hourly", action=argparse.BooleanOptionalAction, default=None, help="pobieraj dane godzinowe")
+    p.add_argument("--minutely", action=argparse.BooleanOptionalAction, default=None, help="pobieraj dane 15-minutowe")
+    p.add_argument("--save-json", action=argparse.BooleanOptionalAction, default=None, help="zapisuj surowe odpowiedzi API")
+    p.add_argument("--control-port", type=int, default=None, help="port interfejsu kontrolnego demona (0 = wyłączony)")
+    p.add_argument("--metrics-file", type=str, default=None,
+                   help="zapisz metryki w formacie Prometheus (textfile) po każdym cyklu, np. data/meteofetch.prom")
+    p.add_argument("--profile", nargs="?", const="stages", default=None, choices=("stages", "cprofile", "sampling"),
+                   help="profiluj cykle (czasy etapów; cprofile/sampling: dodatkowo profil do data/profiles/)")
+    p.add_argument("--startup-budget-ms", type=float, default=None,
+                   help=f"budżet czasu od startu do pierwszego zapytania (domyślnie {startup.STARTUP_BUDGET_MS:.0f} ms)")
     args = p.parse_args()
+    if args.daemon and (args.start_date or args.end_date):
+        # tryb ciągły pobiera prognozę; stały zakres archiwum co tick pobierałby te same dane
+        p.error("--start-date/--end-date (archiwum) działa tylko w pojedynczym cyklu — bez --daemon")
+    startup.mark_start(args.startup_budget_ms)
+    if args.interval is None and not (args.daemon or args.config):
+        args.interval = 15
+
+    if args.daemon:
+        from daemon import run_daemon
+        try:
+            run_daemon(args)
+        except Exception as e:
+            log_exception(logging.getLogger("login"), e, context="daemon")
+        return
+
+    # moduły robocze importujemy dopiero, gdy wiadomo, że będą potrzebne
+    from Api import fetch_and_store_all, DB_PATH, LOCATIONS
 
     try:
-        fetch_minutely = _yes(input("Czy pobrać dane 15-minutowe (minutely_15)? [y/N] "))
-        fetch_hourly = _yes(input("Czy pobrać dane godzinowe (hourly)? [y/N] "))
+        all_locations = LOCATIONS
+        if args.config:
+            # bez pytań: ustawienia z pliku konfiguracyjnego i flag CLI
+            from daemon import load_config, apply_cli_overrides, resolve_locations, apply_alert_thresholds
+            cfg = apply_cli_overrides(load_config(args.config), args)
+            apply_alert_thresholds(cfg)
+            import notify
+            notify.configure(cfg.get("notifications"))
+            fetch_minutely = bool(cfg["fetch_minutely"])
+            fetch_hourly = bool(cfg["fetch_hourly"])
+            save_json = bool(cfg["save_json"])
+            all_loc = True
+            all_locations = resolve_locations(cfg)
+        else:
+            fetch_minutely = _yes(input("Czy pobrać dane 15-minutowe (minutely_15)? [y/N] "))
+            fetch_hourly = _yes(input("Czy pobrać dane godzinowe (hourly)? [y/N] "))
         if not fetch_minutely and not fetch_hourly:
             logger.info("Brak danych do pobrania.")
             return
-        all_loc = _yes(input("Czy pobrać dla wszystkich lokalizacji? [Y/n] ") or "y")
-        save_json = _yes(input("Czy zapisać surowe odpowiedzi API do plików JSON na dysku? [y/N] "))
+        if not args.config:
+            all_loc = _yes(input("Czy pobrać dla wszystkich lokalizacji? [Y/n] ") or "y")
+            save_json = _yes(input("Czy zapisać surowe odpowiedzi API do plików JSON na dysku? [y/N] "))
         # domyślnie pobieramy prognozę; jeśli podano --start-date użyjemy archival (historyczne)
         start_date = args.start_date
         end_date = args.end_date or (args.start_date if args.start_date else None)
 
-        locations = LOCATIONS if all_loc else [LOCATIONS[0]]
+        locations = all_locations if all_loc else [all_locations[0]]
+
+        if args.profile:
+            import profiler
+            # --once: jeden cykl; tryb ciągły: każdy tick aż do zatrzymania
+            profiler.PROFILER.arm(args.profile, cycles=0)
 
         def run_once_cycle():
+            import profiler
+            profiling = profiler.PROFILER.begin_cycle()
+            try:
+                _run_cycle()
+            finally:
+                if profiling:
+                    profiler.PROFILER.end_cycle(label="cycle")
+
+        def _run_cycle():
+            import sqlite3
+            import Alert
+            from backup_db import backup_db
             try:
                 backup_db(DB_PATH, keep=7)
             except Exception:
@@ -47,31 +107,49 @@ def main():
             logger.info("Wstawionych wierszy: %d", inserted)
             try:
                 conn = sqlite3.connect(DB_PATH)
-                total_alerts = 0
-                for loc in locations:
-                    # domyślnie analizujemy alerty na najbliższe 2 dni
-                    total_alerts += Alert.analyze_db_and_alert(conn, loc["id"], location_name=loc.get("name"))
+                # domyślnie analizujemy alerty na najbliższe 2 dni — tylko godziny zmienione przez ten cykl
+                total_alerts = Alert.analyze_changes(conn, locations)
                 conn.close()
                 logger.info("Wygenerowanych alertów: %d", total_alerts)
             except Exception:
                 logger.exception("Błąd analizy alertów")
-        if args.once:
+            import metrics
+            logger.info("Metryki cyklu: %s", metrics.format_summary(metrics.REGISTRY.snapshot()))
+            if args.metrics_file:
+                metrics.REGISTRY.write_textfile(args.metrics_file)
+        if args.once or args.config:
+            # z --config bez --daemon: pojedynczy cykl (tryb ciągły -> --daemon)
+            run_once_cycle()
+            return
+        if start_date:
+            # Scheduler pobiera prognozę — zakres archiwum to zawsze pojedynczy cykl
+            logger.info("Zakres archiwalny (--start-date): pojedynczy cykl, bez trybu ciągłego")
             run_once_cycle()
             return
 
         print("Uruchomić w trybie ciągłym? [y/N] ", end="")
         if _yes(input() or ""):
             logger.info("Start loop co %d minut", args.interval)
+            from scheduler import Scheduler
+            on_tick = None
+            if args.metrics_file:
+                import metrics
+                on_tick = lambda _stats: metrics.REGISTRY.write_textfile(args.metrics_file)
+            sched = Scheduler(locations, interval_min=args.interval, fetch_hourly=fetch_hourly,
+                              save_json=save_json, on_tick=on_tick)
             try:
-                while True:
-                    run_once_cycle()
-                    time.sleep(args.interval * 60)
+                sched.run_forever()
             except KeyboardInterrupt:
+                sched.stop()
                 logger.info("Przerwano przez użytkownika")
         else:
             run_once_cycle()
     except Exception as e:
         log_exception(logging.getLogger("login"), e, context="main")
+    finally:
+        # dostarcz zaległe powiadomienia o alertach przed wyjściem
+        import notify
+        notify.shutdown()
 
 
 if __name__ == "__main__":
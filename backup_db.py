@@ -1,16 +1,38 @@
 import os
-import shutil
+import sqlite3
+import time
+from contextlib import closing
 from datetime import datetime
 from pathlib import Path
 from typing import Union
 
+import metrics
+import profiler
+
+BACKUP_SECONDS = metrics.histogram("meteofetch_backup_seconds", "Czas backup_db (kopia + rotacja)")
+BACKUP_BYTES = metrics.gauge("meteofetch_backup_bytes", "Rozmiar ostatniej kopii bazy")
+BACKUP_FAILURES = metrics.counter("meteofetch_backup_failures", "Nieudane kopie bazy")
+
 def backup_db(db_path: Union[str, Path], backups_dir: Union[str, Path] = "backups", keep: int = 7) -> str:
+    t0 = time.perf_counter()
+    try:
+        with profiler.stage("backup"):
+            dst = _backup_db(db_path, backups_dir, keep)
+    except Exception:
+        BACKUP_FAILURES.inc()
+        raise
+    finally:
+        BACKUP_SECONDS.observe(time.perf_counter() - t0)
+    BACKUP_BYTES.set(os.path.getsize(dst))
+    return dst
+
+def _backup_db(db_path: Union[str, Path], backups_dir: Union[str, Path], keep: int) -> str:
     backups_dir = Path(backups_dir)
     backups_dir.mkdir(parents=True, exist_ok=True)
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     src = Path(db_path)
     dst = backups_dir / f"{src.stem}.{ts}{src.suffix}"
-    shutil.copy2(src, dst)
+    _copy_db(src, dst)
     files = sorted(backups_dir.glob(f"{src.stem}*{src.suffix}"), key=lambda p: p.stat().st_mtime)
     if len(files) > keep:
         for f in files[:len(files)-keep]:
@@ -20,7 +42,13 @@ def backup_db(db_path: Union[str, Path], backups_dir: Union[str, Path] = "backup
                 pass
     return str(dst)
 
+def _copy_db(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    # API kopii SQLite zamiast kopiowania pliku: baza jest w trybie WAL, więc zatwierdzone
+    # zmiany mogą jeszcze być tylko w pliku -wal; kopia jest spójna także przy trwającym zapisie
+    with closing(sqlite3.connect(str(src))) as s, closing(sqlite3.connect(str(dst))) as d:
+        s.backup(d)
+
 def restore_db(backup_file: Union[str, Path], target_db: Union[str, Path]) -> None:
     backup_file = Path(backup_file)
     target_db = Path(target_db)
-    shutil.copy2(backup_file, target_db)
\ No newline at end of file
+    _copy_db(backup_file, target_db)
\ No newline at end of file
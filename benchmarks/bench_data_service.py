@@ -0,0 +1,233 @@
+"""Test obciążeniowy usługi danych (data_service.py) na lokalnej instancji.
+
+Buduje bazę z syntetycznymi danymi (benchmarks/payloads.py) w katalogu tymczasowym,
+uruchamia `data_service.py` w osobnym procesie i odpytuje go z kilku procesów-klientów
+(keep-alive) mieszanką zapytań /hourly, /daily, /alerts i /locations. Tryby klienta:
+  - plain — zawsze pełna odpowiedź,
+  - etag  — If-None-Match z poprzednio otrzymanym ETagiem (oczekiwane 304),
+  - gzip  — Accept-Encoding: gzip.
+Równolegle (`--write-interval`) wątek "ingest" zapisuje zmienioną prognozę przez
+Api._store_hourly; czas zapisu mierzymy bez obciążenia i pod obciążeniem. Baza jest w trybie
+WAL (Api._ensure_db), więc odczyty usługi nie blokują zapisu blokadami SHARED. Na maszynie
+z jednym rdzeniem klienci, serwer i ingest dzielą CPU — pozostały wzrost czasu zapisu to
+wtedy głównie konkurencja o procesor (porównaj z --clients 1).
+
+Użycie:
+    python benchmarks/bench_data_service.py --locations 10 --duration 10 --clients 4 --mode etag
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import payloads  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _paths(location_ids: List[int]) -> List[str]:
+    today = datetime.utcnow().date()
+    end = (today + timedelta(days=7)).isoformat()
+    out = ["/locations"]
+    for loc in location_ids:
+        out += [f"/hourly?location={loc}&start={today.isoformat()}&end={end}",
+                f"/hourly?location={loc}&start={(today - timedelta(days=30)).isoformat()}&end={today.isoformat()}",
+                f"/daily?location={loc}",
+                f"/alerts?location={loc}&open=1"]
+    return out
+
+
+def client(port: int, paths: List[str], duration: float, mode: str, seed: int) -> Dict[str, Any]:
+    """Pętla jednego klienta (osobny proces); zwraca czasy odpowiedzi i statusy."""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    etags: Dict[str, str] = {}
+    lat: List[float] = []
+    statuses: Dict[int, int] = {}
+    nbytes = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        headers = {}
+        if mode == "gzip":
+            headers["Accept-Encoding"] = "gzip"
+        if mode == "etag" and path in etags:
+            headers["If-None-Match"] = etags[path]
+        t0 = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        lat.append(time.perf_counter() - t0)
+        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+        nbytes += len(body)
+        if resp.getheader("ETag"):
+            etags[path] = resp.getheader("ETag")
+    conn.close()
+    return {"latencies": lat, "statuses": statuses, "bytes": nbytes}
+
+
+def _pct(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+class Ingest(threading.Thread):
+    """Symulacja ingestu: co `interval` s zapis prognozy z kilkoma zmienionymi godzinami."""
+
+    def __init__(self, api, db_path: str, locations: List[Dict[str, Any]], interval: float):
+        super().__init__(name="bench-ingest", daemon=True)
+        self.api = api
+        self.db_path = db_path
+        self.locations = locations
+        self.interval = interval
+        self.data = {loc["id"]: payloads.forecast_payload(loc["lat"], loc["lon"], days=7) for loc in locations}
+        self.times: List[float] = []
+        self.stop_event = threading.Event()
+        self._rng = random.Random(1)
+
+    def write_once(self) -> float:
+        loc = self._rng.choice(self.locations)
+        temps = self.data[loc["id"]]["hourly"]["temperature_2m"]
+        for i in self._rng.sample(range(len(temps)), 6):
+            temps[i] = round(temps[i] + self._rng.uniform(-2, 2), 1)
+        conn = sqlite3.connect(self.db_path)
+        t0 = time.perf_counter()
+        self.api._store_hourly(conn, loc["id"], self.data[loc["id"]])
+        elapsed = time.perf_counter() - t0
+        conn.close()
+        return elapsed
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.times.append(self.write_once())
+
+
+def _fill_db(api, alert, locations: List[Dict[str, Any]], years: float) -> int:
+    api._ensure_db()
+    conn = sqlite3.connect(api.DB_PATH)
+    rows = 0
+    for loc in locations:
+        rows += api._store_hourly(conn, loc["id"], payloads.archive_years(loc["lat"], loc["lon"], years))
+        rows += api._store_hourly(conn, loc["id"], payloads.forecast_payload(loc["lat"], loc["lon"], days=7))
+    alert.analyze_changes(conn, locations)
+    conn.close()
+    return rows
+
+
+def _wait_ready(port: int, proc: subprocess.Popen, timeout: float = 15.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"data_service.py zakończył się z kodem {proc.returncode}")
+        try:
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            c.request("GET", "/health")
+            if c.getresponse().status == 200:
+                c.close()
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("data_service.py nie wystartował")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--locations", type=int, default=10)
+    p.add_argument("--years", type=float, default=0.5, help="lata danych archiwalnych na lokalizację")
+    p.add_argument("--duration", type=float, default=10.0, help="czas obciążenia [s]")
+    p.add_argument("--clients", type=int, default=4, help="liczba procesów-klientów")
+    p.add_argument("--mode", choices=("plain", "etag", "gzip"), default="plain")
+    p.add_argument("--write-interval", type=float, default=0.5, help="odstęp zapisów ingestu [s]; 0 = bez zapisów")
+    p.add_argument("--json", type=str, default=None, help="zapisz wyniki do pliku JSON")
+    args = p.parse_args()
+
+    import logging
+    logging.getLogger("meteofetch").setLevel(logging.ERROR)
+    import Alert
+    import Api
+
+    with tempfile.TemporaryDirectory(prefix="meteofetch-data-service-") as tmp:
+        Api.DB_PATH = os.path.join(tmp, "bench.db")
+        locations = payloads.synthetic_locations(args.locations)
+        rows = _fill_db(Api, Alert, locations, args.years)
+        ingest = Ingest(Api, Api.DB_PATH, locations, args.write_interval)
+        baseline = [ingest.write_once() for _ in range(20)] if args.write_interval else []
+
+        port = _free_port()
+        proc = subprocess.Popen([sys.executable, str(ROOT / "data_service.py"), "--db", Api.DB_PATH,
+                                 "--port", str(port)], stdout=subprocess.DEVNULL)
+        try:
+            _wait_ready(port, proc)
+            paths = _paths([loc["id"] for loc in locations])
+            if args.write_interval:
+                ingest.start()
+            t0 = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.clients) as ex:
+                futures = [ex.submit(client, port, paths, args.duration, args.mode, seed)
+                           for seed in range(args.clients)]
+                results = [f.result() for f in futures]
+            wall = time.perf_counter() - t0
+            ingest.stop_event.set()
+            c = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            c.request("GET", "/health")
+            health = json.loads(c.getresponse().read())
+            c.close()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    lat = [x for r in results for x in r["latencies"]]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        for k, v in r["statuses"].items():
+            statuses[str(k)] = statuses.get(str(k), 0) + v
+    summary = {
+        "name": "data_service_load",
+        "params": {k: v for k, v in vars(args).items() if k != "json"},
+        "db_rows": rows,
+        "requests": len(lat),
+        "requests_per_s": len(lat) / wall if wall else None,
+        "latency_ms": {"p50": _pct(lat, 0.5) * 1000, "p95": _pct(lat, 0.95) * 1000, "p99": _pct(lat, 0.99) * 1000},
+        "statuses": statuses,
+        "bytes_per_request": sum(r["bytes"] for r in results) / len(lat) if lat else 0,
+        "writes": len(ingest.times),
+        "write_ms_median_idle": statistics.median(baseline) * 1000 if baseline else None,
+        "write_ms_median_under_load": statistics.median(ingest.times) * 1000 if ingest.times else None,
+        "server": health,
+    }
+    print(f"zapytań: {summary['requests']} w {wall:.1f}s -> {summary['requests_per_s']:.0f}/s "
+          f"(klienci: {args.clients}, tryb: {args.mode})")
+    print("opóźnienie p50/p95/p99: {p50:.2f} / {p95:.2f} / {p99:.2f} ms".format(**summary["latency_ms"]))
+    print(f"statusy: {statuses}, średnio {summary['bytes_per_request']:.0f} B/odpowiedź")
+    if baseline:
+        under = summary["write_ms_median_under_load"]
+        print(f"zapis ingestu (mediana): bez obciążenia {summary['write_ms_median_idle']:.2f} ms, "
+              f"pod obciążeniem {under:.2f} ms ({summary['writes']} zapisów)" if under is not None else
+              "zapis ingestu: brak zapisów pod obciążeniem")
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
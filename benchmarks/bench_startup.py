@@ -0,0 +1,104 @@
+"""Benchmark startu `python Main.py --once` (time to first request) + profil importów.
+
+Uruchamia Main.py w podprocesie na kopii źródeł w katalogu tymczasowym (nie dotyka
+data.db ani backups/ w repozytorium) z `-X importtime` i METEOFETCH_STARTUP_PROBE=1,
+więc proces kończy się w chwili pierwszego zapytania HTTP — bez dostępu do sieci.
+
+Użycie:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 15] [--json wynik.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _prepare_tree(tmp: Path) -> Path:
+    for src in ROOT.glob("*.py"):
+        shutil.copy2(src, tmp / src.name)
+    if (ROOT / "data.db").exists():
+        shutil.copy2(ROOT / "data.db", tmp / "data.db")
+    cfg = {"locations": [{"id": 1, "name": "bench", "lat": 47.0, "lon": 11.0}],
+           "fetch_hourly": True, "save_json": False}
+    cfg_path = tmp / "bench_config.json"
+    cfg_path.write_text(json.dumps(cfg), encoding="utf-8")
+    return cfg_path
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Zwraca [(moduł, self_us, cumulative_us)] z wyjścia `-X importtime`."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line.split(":", 1)[1].split("|", 2)
+            out.append((name.strip(), int(self_us), int(cum_us)))
+        except ValueError:
+            continue
+    return out
+
+
+def run_once(cwd: Path, cfg_path: Path) -> dict:
+    env = dict(os.environ, METEOFETCH_STARTUP_PROBE="1", PYTHONDONTWRITEBYTECODE="1")
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "Main.py", "--once", "--config", str(cfg_path)],
+                          cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    first_ms = None
+    for line in proc.stderr.splitlines():
+        if line.startswith("startup_first_request_ms="):
+            first_ms = float(line.split("=", 1)[1])
+    imports = parse_importtime(proc.stderr)
+    return {"wall_ms": wall_ms, "first_request_ms": first_ms, "imports": imports,
+            "import_total_us": sum(i[1] for i in imports), "returncode": proc.returncode}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--top", type=int, default=15)
+    p.add_argument("--budget-ms", type=float, default=None, help="kod wyjścia 1, jeśli mediana przekroczy budżet")
+    p.add_argument("--json", type=str, default=None, help="zapisz wyniki do pliku JSON")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="meteofetch-startup-") as tmp:
+        tmp = Path(tmp)
+        cfg_path = _prepare_tree(tmp)
+        runs = [run_once(tmp, cfg_path) for _ in range(args.repeat)]
+
+    bad = [r for r in runs if r["first_request_ms"] is None]
+    if bad:
+        print(f"UWAGA: {len(bad)} przebieg(ów) nie doszło do pierwszego zapytania (returncode={bad[0]['returncode']})")
+    firsts = [r["first_request_ms"] for r in runs if r["first_request_ms"] is not None]
+    walls = [r["wall_ms"] for r in runs]
+    summary = {
+        "name": "startup_once",
+        "repeat": args.repeat,
+        "first_request_ms_median": statistics.median(firsts) if firsts else None,
+        "wall_ms_median": statistics.median(walls),
+        "import_total_ms_median": statistics.median(r["import_total_us"] for r in runs) / 1000.0,
+        "top_imports": sorted(runs[-1]["imports"], key=lambda i: i[2], reverse=True)[:args.top],
+    }
+    print(f"time to first request (mediana): {summary['first_request_ms_median']} ms")
+    print(f"czas procesu (mediana):          {summary['wall_ms_median']:.1f} ms")
+    print(f"importy łącznie (mediana):       {summary['import_total_ms_median']:.1f} ms")
+    print("najdroższe importy (cumulative):")
+    for name, self_us, cum_us in summary["top_imports"]:
+        print(f"  {cum_us / 1000.0:8.2f} ms  {name}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    if args.budget_ms is not None and firsts and summary["first_request_ms_median"] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Generator syntetycznych odpowiedzi Open-Meteo (hourly + minutely_15) do benchmarków.
+
+Wartości są deterministyczne (seed zależny od lokalizacji), mają dobowy i sezonowy
+przebieg temperatury oraz okresowe epizody mrozu, silnego wiatru i opadów, żeby
+analiza alertów miała realistyczną ilość pracy.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+HOURLY_VARS = ["temperature_2m", "rain", "snowfall", "wind_speed_10m", "weathercode"]
+MINUTELY_VARS = ["temperature_2m", "rain", "snowfall", "wind_speed_10m"]
+
+
+def synthetic_locations(n: int) -> List[Dict[str, Any]]:
+    """n lokalizacji rozłożonych na siatce w Alpach."""
+    return [{"id": i + 1, "name": f"bench-{i + 1}",
+             "lat": round(46.0 + (i % 10) * 0.15, 3), "lon": round(8.0 + (i // 10) * 0.2, 3)}
+            for i in range(n)]
+
+
+def _series(rng: random.Random, start: datetime, steps: int, step: timedelta) -> Dict[str, list]:
+    times, temps, rains, snows, winds, codes = [], [], [], [], [], []
+    t = start
+    storm_left = 0
+    for i in range(steps):
+        doy = t.timetuple().tm_yday
+        hour = t.hour + t.minute / 60.0
+        temp = -4.0 - 10.0 * math.cos(2 * math.pi * doy / 365.0) - 4.0 * math.cos(2 * math.pi * (hour - 14) / 24.0)
+        temp += rng.gauss(0.0, 2.0)
+        wind = abs(rng.gauss(12.0, 6.0))
+        if storm_left == 0 and rng.random() < 0.01:
+            storm_left = rng.randint(3, 12)
+        code = rng.choice((0, 1, 2, 3, 3, 45))
+        rain = snow = 0.0
+        if storm_left > 0:
+            storm_left -= 1
+            wind += rng.uniform(20.0, 40.0)
+            if temp < 0:
+                snow = round(rng.uniform(0.1, 2.0), 2)
+                code = rng.choice((71, 73, 75, 85))
+            else:
+                rain = round(rng.uniform(0.1, 5.0), 1)
+                code = rng.choice((61, 63, 65, 80, 95))
+        times.append(t.strftime("%Y-%m-%dT%H:%M"))
+        temps.append(round(temp, 1))
+        rains.append(rain)
+        snows.append(snow)
+        winds.append(round(wind, 1))
+        codes.append(code)
+        t += step
+    return {"time": times, "temperature_2m": temps, "rain": rains, "snowfall": snows,
+            "wind_speed_10m": winds, "weathercode": codes}
+
+
+def make_payload(lat: float, lon: float, start: datetime, hours: int, minutely: bool = False,
+                 seed: Optional[int] = None) -> Dict[str, Any]:
+    """Odpowiedź w formacie Open-Meteo: `hours` godzin od `start` (+ minutely_15, jeśli minutely)."""
+    rng = random.Random(seed if seed is not None else hash((round(lat, 3), round(lon, 3))) & 0xFFFFFFFF)
+    start = start.replace(minute=0, second=0, microsecond=0)
+    payload: Dict[str, Any] = {
+        "latitude": lat, "longitude": lon,
+        "generationtime_ms": round(rng.uniform(0.2, 3.0), 3),
+        "utc_offset_seconds": 0, "timezone": "GMT", "timezone_abbreviation": "GMT",
+        "elevation": 2000.0,
+        "hourly_units": {"time": "iso8601", "temperature_2m": "°C", "rain": "mm", "snowfall": "cm",
+                         "wind_speed_10m": "km/h", "weathercode": "wmo code"},
+        "hourly": _series(rng, start, hours, timedelta(hours=1)),
+    }
+    if minutely:
+        block = _series(rng, start, hours * 4, timedelta(minutes=15))
+        payload["minutely_15"] = {k: block[k] for k in ["time"] + MINUTELY_VARS}
+    return payload
+
+
+def forecast_payload(lat: float, lon: float, days: int = 7, minutely: bool = False,
+                     now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Prognoza jak z /v1/forecast: od początku bieżącej doby UTC na `days` dni."""
+    now = now or datetime.utcnow()
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return make_payload(lat, lon, start, days * 24, minutely=minutely)
+
+
+def archive_payload(lat: float, lon: float, start_date: str, end_date: str,
+                    minutely: bool = False) -> Dict[str, Any]:
+    """Dane historyczne jak z /v1/archive dla zakresu dat (włącznie)."""
+    sd = datetime.fromisoformat(start_date)
+    ed = datetime.fromisoformat(end_date)
+    hours = ((ed - sd).days + 1) * 24
+    return make_payload(lat, lon, sd, hours, minutely=minutely)
+
+
+def archive_years(lat: float, lon: float, years: float, minutely: bool = False,
+                  end: Optional[datetime] = None) -> Dict[str, Any]:
+    """`years` lat danych godzinowych kończących się na `end` (domyślnie dziś)."""
+    end = (end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    hours = int(years * 365.25 * 24)
+    return make_payload(lat, lon, end - timedelta(hours=hours), hours, minutely=minutely)
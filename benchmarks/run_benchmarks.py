@@ -0,0 +1,274 @@
+"""Offline benchmarki meteofetch (bez dostępu do sieci).
+
+Mierzone:
+  - store_hourly          — Api._store_hourly (ingest N lat danych godzinowych),
+  - fetch_and_store_all   — Api.fetch_and_store_all end-to-end przez lokalny serwer zastępczy
+                            (benchmarks/stub_server.py; opóźnienie i odpowiedzi 429 konfigurowalne),
+  - analyze_alerts        — Alert.analyze_changes: pełna ocena horyzontu (bez stanu i bloków),
+  - analyze_changes       — Alert.analyze_changes po zmianie kilku godzin prognozy (analiza przyrostowa),
+  - backup_db             — backup_db.backup_db na bazie z benchmarku ingestu,
+  - export_table_to_json  — save_json.export_table_to_json tabeli hourly.
+
+Wyniki zapisywane są jako JSON (domyślnie benchmarks/results/<czas>.json). Z `--baseline`
+porównujemy mediany z poprzednim wynikiem i kończymy kodem 1 przy regresji > `--threshold`.
+
+Przykład:
+    python benchmarks/run_benchmarks.py --locations 10 --years 2 --repeat 3
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import payloads  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _measure(fn: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    times: List[float] = []
+    last = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        last = fn()
+        times.append(time.perf_counter() - t0)
+    return {"runs": repeat, "min_s": min(times), "median_s": statistics.median(times),
+            "mean_s": statistics.fmean(times), "last_result": last}
+
+
+class Bench:
+    def __init__(self, args, workdir: Path):
+        self.args = args
+        self.workdir = workdir
+        self.locations = payloads.synthetic_locations(args.locations)
+        self.db_path = str(workdir / "bench.db")
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+        # kod aplikacji kierujemy na katalog tymczasowy (nie dotykamy data.db ani data/)
+        import Api
+        import save_json
+        Api.DB_PATH = self.db_path
+        Api.JSON_DIR = str(workdir / "json")
+        save_json.DATA_DIR = workdir / "export"
+        self.Api = Api
+
+    def _fresh_db(self) -> None:
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        self.Api._ensure_db()
+
+    # --- benchmarki ---
+    def bench_store_hourly(self) -> None:
+        data = [payloads.archive_years(loc["lat"], loc["lon"], self.args.years) for loc in self.locations]
+        rows = sum(len(p["hourly"]["time"]) for p in data)
+
+        def run():
+            conn = sqlite3.connect(self.db_path)
+            n = sum(self.Api._store_hourly(conn, loc["id"], p) for loc, p in zip(self.locations, data))
+            conn.close()
+            return n
+
+        r = _measure(run, self.args.repeat, setup=self._fresh_db)
+        r.update(rows=rows, rows_per_s=rows / r["median_s"] if r["median_s"] else None)
+        self.results["store_hourly"] = r
+
+    def bench_fetch_and_store_all(self) -> None:
+        try:
+            import requests  # noqa: F401
+        except ImportError:
+            self.results["fetch_and_store_all"] = {"skipped": "brak biblioteki requests"}
+            return
+        Api = self.Api
+        old = (Api.FORECAST_URL, Api.ARCHIVE_URL, Api.MIN_REQUEST_INTERVAL)
+        with StubServer(latency_s=self.args.latency, rate_429=self.args.rate_429) as srv:
+            Api.FORECAST_URL = srv.url + "/v1/forecast"
+            Api.ARCHIVE_URL = srv.url + "/v1/archive"
+            if not self.args.throttle:
+                Api.MIN_REQUEST_INTERVAL = 0.0
+            try:
+                def run():
+                    return Api.fetch_and_store_all(fetch_hourly=True, locations=self.locations)
+                r = _measure(run, self.args.repeat, setup=self._fresh_db)
+                if self.args.years:
+                    end = datetime.utcnow().date()
+                    start = end.replace(year=end.year - max(int(self.args.years), 1))
+
+                    def run_archive():
+                        return Api.fetch_and_store_all(fetch_hourly=True, locations=self.locations,
+                                                       start_date=start.isoformat(), end_date=end.isoformat())
+                    ra = _measure(run_archive, self.args.repeat, setup=self._fresh_db)
+                    self.results["fetch_and_store_all_archive"] = dict(
+                        ra, rows=ra["last_result"], requests=len(self.locations))
+            finally:
+                Api.FORECAST_URL, Api.ARCHIVE_URL, Api.MIN_REQUEST_INTERVAL = old
+            r.update(rows=r["last_result"], requests=len(self.locations),
+                     stub_requests=srv.requests, stub_throttled=srv.throttled,
+                     latency_s=self.args.latency, rate_429=self.args.rate_429)
+        self.results["fetch_and_store_all"] = r
+
+    def bench_analyze_alerts(self) -> None:
+        import Alert
+        data = [payloads.forecast_payload(loc["lat"], loc["lon"], days=7) for loc in self.locations]
+        self._fresh_db()
+        conn = sqlite3.connect(self.db_path)
+        for loc, p in zip(self.locations, data):
+            self.Api._store_hourly(conn, loc["id"], p)
+
+        def run():
+            # bez stanu analizy i bloków — pełna ocena horyzontu, jak pierwszy przebieg w produkcji
+            conn.execute("DELETE FROM alerts")
+            conn.execute("DELETE FROM alert_state")
+            conn.commit()
+            return Alert.analyze_changes(conn, self.locations)
+
+        r = _measure(run, self.args.repeat)
+        conn.close()
+        r.update(alerts=r["last_result"], locations=len(self.locations))
+        self.results["analyze_alerts"] = r
+
+    def bench_analyze_changes(self) -> None:
+        import Alert
+        data = [payloads.forecast_payload(loc["lat"], loc["lon"], days=7) for loc in self.locations]
+        changed_hours = 3
+        conns: List[sqlite3.Connection] = []
+
+        def setup():
+            # pełna ocena świeżej bazy, potem nowa prognoza różniąca się kilkoma godzinami (jutro, w horyzoncie)
+            for c in conns:
+                c.close()
+            self._fresh_db()
+            conns[:] = [sqlite3.connect(self.db_path)]
+            for loc, p in zip(self.locations, data):
+                self.Api._store_hourly(conns[0], loc["id"], p)
+            Alert.analyze_changes(conns[0], self.locations)
+            for loc, p in zip(self.locations, data):
+                changed = {"hourly": {k: list(v) for k, v in p["hourly"].items()}}
+                temps = changed["hourly"]["temperature_2m"]
+                for i in range(30, 30 + changed_hours):
+                    temps[i] -= 20.0
+                self.Api._store_hourly(conns[0], loc["id"], changed)
+
+        def run():
+            return Alert.analyze_changes(conns[0], self.locations)
+
+        r = _measure(run, self.args.repeat, setup=setup)
+        for c in conns:
+            c.close()
+        r.update(alerts=r["last_result"], locations=len(self.locations), changed_hours=changed_hours)
+        self.results["analyze_changes"] = r
+
+    def _ensure_filled_db(self) -> int:
+        self._fresh_db()
+        conn = sqlite3.connect(self.db_path)
+        rows = 0
+        for loc in self.locations:
+            rows += self.Api._store_hourly(conn, loc["id"],
+                                           payloads.archive_years(loc["lat"], loc["lon"], self.args.years))
+        conn.close()
+        return rows
+
+    def bench_backup_db(self) -> None:
+        from backup_db import backup_db
+        rows = self._ensure_filled_db()
+        backups = self.workdir / "backups"
+        r = _measure(lambda: backup_db(self.db_path, backups_dir=backups, keep=3), self.args.repeat)
+        r.update(rows=rows, db_bytes=os.path.getsize(self.db_path), last_result=None)
+        self.results["backup_db"] = r
+
+    def bench_export_table_to_json(self) -> None:
+        from save_json import export_table_to_json
+        rows = self._ensure_filled_db()
+        r = _measure(lambda: str(export_table_to_json(self.db_path, "hourly")), self.args.repeat)
+        r.update(rows=rows, rows_per_s=rows / r["median_s"] if r["median_s"] else None, last_result=None)
+        self.results["export_table_to_json"] = r
+
+    def run(self, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        for name in ("store_hourly", "fetch_and_store_all", "analyze_alerts", "analyze_changes", "backup_db",
+                     "export_table_to_json"):
+            if only and name not in only:
+                continue
+            print(f"-> {name} ...", flush=True)
+            getattr(self, "bench_" + name)()
+        for r in self.results.values():
+            r.pop("last_result", None)
+        return self.results
+
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            threshold: float) -> List[str]:
+    """Lista regresji: benchmarki, których mediana wzrosła o więcej niż `threshold` (ułamek)."""
+    regressions = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or "median_s" not in cur or "median_s" not in base or not base["median_s"]:
+            continue
+        ratio = cur["median_s"] / base["median_s"]
+        flag = "REGRESJA" if ratio > 1.0 + threshold else "ok"
+        print(f"  {name:<28} {base['median_s']:10.4f}s -> {cur['median_s']:10.4f}s  x{ratio:5.2f}  {flag}")
+        if flag != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--locations", type=int, default=5, help="liczba syntetycznych lokalizacji")
+    p.add_argument("--years", type=float, default=1.0, help="lata danych godzinowych na lokalizację (ingest/archive)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0.01, help="opóźnienie serwera zastępczego [s]")
+    p.add_argument("--rate-429", type=float, default=0.0, help="ułamek odpowiedzi 429 z serwera zastępczego")
+    p.add_argument("--throttle", action="store_true", help="zachowaj Api.MIN_REQUEST_INTERVAL (domyślnie 0 w benchmarku)")
+    p.add_argument("--only", nargs="*", default=None, help="uruchom tylko wskazane benchmarki")
+    p.add_argument("--out", type=str, default=None, help="plik wynikowy JSON")
+    p.add_argument("--baseline", type=str, default=None, help="plik JSON z poprzednim wynikiem do porównania")
+    p.add_argument("--threshold", type=float, default=0.15, help="dopuszczalny wzrost mediany (ułamek)")
+    args = p.parse_args()
+
+    logging.getLogger("meteofetch").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory(prefix="meteofetch-bench-") as tmp:
+        results = Bench(args, Path(tmp)).run(args.only)
+
+    doc = {
+        "meta": {"timestamp": datetime.utcnow().isoformat() + "Z", "python": sys.version.split()[0],
+                 "platform": platform.platform(), "params": {k: v for k, v in vars(args).items()
+                                                             if k not in ("out", "baseline")}},
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"  {name:<28} pominięto: {r['skipped']}")
+        else:
+            extra = f"  {r['rows_per_s']:.0f} wierszy/s" if r.get("rows_per_s") else ""
+            print(f"  {name:<28} mediana {r['median_s']:.4f}s  min {r['min_s']:.4f}s{extra}")
+    print(f"Zapisano: {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print(f"Porównanie z {args.baseline} (próg +{args.threshold:.0%}):")
+        if compare(results, baseline.get("results", {}), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
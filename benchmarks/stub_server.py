@@ -0,0 +1,140 @@
+"""Lokalny serwer zastępczy Open-Meteo (bez dostępu do sieci).
+
+Obsługuje GET /v1/forecast i GET /v1/archive z parametrami jak prawdziwe API
+(latitude, longitude, start_date, end_date, minutely_15) i zwraca payloady z
+`benchmarks/payloads.py`. Konfigurowalne:
+  - latency_s: opóźnienie każdej odpowiedzi,
+  - rate_429: ułamek zapytań kończonych 429 Too Many Requests (z nagłówkiem Retry-After).
+
+Użycie z kodu:
+    with StubServer(latency_s=0.02, rate_429=0.1) as srv:
+        Api.FORECAST_URL = srv.url + "/v1/forecast"
+        ...
+albo samodzielnie:  python benchmarks/stub_server.py --port 8081 --latency 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from . import payloads
+except ImportError:  # uruchomienie jako skrypt
+    import payloads
+
+
+class StubServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.0,
+                 rate_429: float = 0.0, forecast_days: int = 7, seed: int = 0):
+        self.latency_s = latency_s
+        self.rate_429 = rate_429
+        self.forecast_days = forecast_days
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._cache: Dict[tuple, bytes] = {}
+        self.requests = 0
+        self.throttled = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _body(self, path: str, query: Dict[str, list]) -> Optional[bytes]:
+        lat = float(query.get("latitude", ["47.0"])[0])
+        lon = float(query.get("longitude", ["11.0"])[0])
+        minutely = bool(query.get("minutely_15"))
+        if path == "/v1/forecast":
+            key = (path, lat, lon, minutely)
+            if key not in self._cache:
+                self._cache[key] = json.dumps(
+                    payloads.forecast_payload(lat, lon, self.forecast_days, minutely=minutely)).encode("utf-8")
+            return self._cache[key]
+        if path == "/v1/archive":
+            sd = query.get("start_date", [None])[0]
+            ed = query.get("end_date", [None])[0] or sd
+            if not sd:
+                return None
+            key = (path, lat, lon, sd, ed, minutely)
+            if key not in self._cache:
+                self._cache[key] = json.dumps(
+                    payloads.archive_payload(lat, lon, sd, ed, minutely=minutely)).encode("utf-8")
+            return self._cache[key]
+        return None
+
+    def _make_handler(self):
+        srv = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                srv.requests += 1
+                if srv.latency_s:
+                    time.sleep(srv.latency_s)
+                with srv._rng_lock:
+                    throttle = srv.rate_429 and srv._rng.random() < srv.rate_429
+                if throttle:
+                    srv.throttled += 1
+                    raw = b'{"error": true, "reason": "Too many requests"}'
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                else:
+                    raw = srv._body(parts.path, parse_qs(parts.query))
+                    if raw is None:
+                        raw = b'{"error": true, "reason": "not found"}'
+                        self.send_response(404)
+                    else:
+                        self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, fmt, *a):
+                pass
+
+        return _Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-open-meteo", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--port", type=int, default=8081)
+    p.add_argument("--latency", type=float, default=0.0, help="opóźnienie odpowiedzi [s]")
+    p.add_argument("--rate-429", type=float, default=0.0, help="ułamek odpowiedzi 429")
+    args = p.parse_args()
+    srv = StubServer(port=args.port, latency_s=args.latency, rate_429=args.rate_429)
+    print(f"Stub Open-Meteo: {srv.url}/v1/forecast, {srv.url}/v1/archive")
+    srv.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.stop()
+
+
+if __name__ == "__main__":
+    main()
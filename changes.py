@@ -0,0 +1,49 @@
+"""Rejestr godzin zmienionych przez ingest (tabela alert_dirty, patrz Api._ensure_db).
+
+`Api._store_hourly` porównuje pobrane wiersze z tym, co już jest w tabeli hourly, i
+zapisuje tu godziny (timestamp), które faktycznie się zmieniły albo są nowe — w tej samej
+transakcji co dane godzinowe, więc proces przerwany przed analizą alertów (np. `--once`)
+ich nie gubi. `Alert.analyze_changes` odbiera je (`take`) w swojej transakcji i ocenia
+reguły tylko w ich otoczeniu zamiast całego horyzontu; błąd analizy = rollback, a godziny
+czekają na następną analizę.
+
+Obie funkcje nie robią commitu — robi go wołający.
+"""
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import metrics
+
+CHANGED_HOURS = metrics.counter("meteofetch_changed_hours", "Godziny zmienione przez ingest")
+
+
+def record(conn: sqlite3.Connection, location_id: Any, timestamps: Iterable[str]) -> int:
+    """Zapisz zmienione godziny (bez commitu); zwraca ich liczbę."""
+    ts = set(timestamps)
+    if not ts:
+        return 0
+    CHANGED_HOURS.inc(len(ts))
+    # godziny przeszłe nigdy nie wejdą do horyzontu alertów (np. import archiwum) — pomijamy
+    cutoff = datetime.utcnow().strftime("%Y-%m-%dT%H:00")
+    conn.executemany("INSERT OR IGNORE INTO alert_dirty (location_id, timestamp) VALUES (?, ?)",
+                     [(location_id, t) for t in sorted(ts) if t >= cutoff])
+    return len(ts)
+
+
+def take(conn: sqlite3.Connection, location_ids: Optional[Iterable[Any]] = None) -> Dict[Any, List[str]]:
+    """Odbierz (i usuń) zmienione godziny, posortowane; domyślnie dla wszystkich lokalizacji."""
+    if location_ids is None:
+        where, params = "", []
+    else:
+        params = list(location_ids)
+        if not params:
+            return {}
+        where = f" WHERE location_id IN ({','.join('?' * len(params))})"
+    out: Dict[Any, List[str]] = {}
+    for loc, ts in conn.execute(f"SELECT location_id, timestamp FROM alert_dirty{where} ORDER BY location_id, timestamp",
+                                params):
+        out.setdefault(loc, []).append(ts)
+    if out:
+        conn.execute(f"DELETE FROM alert_dirty{where}", params)
+    return out
@@ -0,0 +1,294 @@
+"""Tryb demona: bez pytań `input()`, konfiguracja z pliku JSON + flagi CLI.
+
+- plik konfiguracyjny (domyślnie `meteofetch.json`, przykład: `meteofetch.example.json`),
+- przeładowanie w locie (bez restartu) listy lokalizacji i progów alertów, gdy zmieni się
+  mtime pliku,
+- sesja HTTP (moduł Api), połączenie DB i stan harmonogramu żyją przez cały czas pracy,
+- lokalny interfejs kontrolny HTTP (tylko 127.0.0.1):
+    GET  /status  -> JSON ze stanem (ostatni tick, liczniki, konfiguracja)
+    GET  /metrics -> metryki w formacie Prometheus (moduł metrics)
+    POST /profile?mode=stages|cprofile|sampling&cycles=N -> profil kolejnych N ticków
+    POST /profile/stop -> wyłączenie profilera
+    POST /run     -> natychmiastowy cykl
+    POST /reload  -> natychmiastowe przeładowanie konfiguracji
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import Alert
+import notify
+import profiler
+
+LOGGER = logging.getLogger("meteofetch.daemon")
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "meteofetch.json")
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "interval": 15,
+    "fetch_hourly": True,
+    "fetch_minutely": False,
+    "save_json": False,
+    "locations": None,          # None -> Api.LOCATIONS
+    "alerts": {},               # temp_low / wind / precip_codes / rules -> Alert.configure_alerts (rules.py)
+    "scheduler": {},            # spread / jitter_s / max_backoff / backup_keep
+    "control": {"host": "127.0.0.1", "port": 8765},
+    "data_service": {"host": "127.0.0.1", "port": None, "pool": 4},   # port -> data_service.py (odczyt danych)
+    "metrics": {"textfile": None},   # ścieżka pliku .prom (textfile collector) albo None
+    "notifications": {},             # file / webhook / smtp / batch_window_s -> notify.configure
+    "reload_check_s": 5,
+}
+
+
+def load_config(path: Optional[str]) -> Dict[str, Any]:
+    """Wczytaj konfigurację JSON i nałóż na wartości domyślne. Brak pliku -> same domyślne."""
+    cfg = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            user = json.load(f)
+        for k, v in user.items():
+            if isinstance(v, dict) and isinstance(cfg.get(k), dict):
+                cfg[k].update(v)
+            else:
+                cfg[k] = v
+    elif path:
+        LOGGER.warning("Brak pliku konfiguracyjnego %s — używam wartości domyślnych", path)
+    return cfg
+
+
+def apply_cli_overrides(cfg: Dict[str, Any], args) -> Dict[str, Any]:
+    """Flagi CLI mają pierwszeństwo przed plikiem (tylko te jawnie podane)."""
+    if getattr(args, "interval", None) is not None:
+        cfg["interval"] = args.interval
+    if getattr(args, "hourly", None) is not None:
+        cfg["fetch_hourly"] = args.hourly
+    if getattr(args, "minutely", None) is not None:
+        cfg["fetch_minutely"] = args.minutely
+    if getattr(args, "save_json", None) is not None:
+        cfg["save_json"] = args.save_json
+    if getattr(args, "control_port", None) is not None:
+        cfg["control"]["port"] = args.control_port
+    if getattr(args, "metrics_file", None) is not None:
+        cfg["metrics"]["textfile"] = args.metrics_file
+    return cfg
+
+
+def resolve_locations(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if cfg.get("locations"):
+        return list(cfg["locations"])
+    from Api import LOCATIONS
+    return list(LOCATIONS)
+
+
+def apply_alert_thresholds(cfg: Dict[str, Any]) -> None:
+    # cała sekcja naraz: błąd nie zostawia połowy konfiguracji, brakujący klucz = domyślny
+    Alert.configure_alerts(cfg.get("alerts"))
+
+
+class Daemon:
+    def __init__(self, config_path: Optional[str], args=None):
+        self.config_path = config_path
+        self.args = args
+        self.cfg = apply_cli_overrides(load_config(config_path), args)
+        self._mtime = self._config_mtime()
+        self.started_at = time.time()
+        self.reloads = 0
+        apply_alert_thresholds(self.cfg)
+        notify.configure(self.cfg.get("notifications"))
+        # scheduler i http.server są ciężkie — `--once --config` korzysta tylko z load_config
+        from scheduler import Scheduler
+        sc = self.cfg.get("scheduler") or {}
+        self.scheduler = Scheduler(resolve_locations(self.cfg), interval_min=self.cfg["interval"],
+                                   fetch_hourly=self.cfg["fetch_hourly"], save_json=self.cfg["save_json"],
+                                   on_tick=self._after_tick,
+                                   **{k: sc[k] for k in ("spread", "jitter_s", "max_backoff", "backup_keep") if k in sc})
+        self._stop = threading.Event()
+        self._server = None
+        self._data_service = None
+        # reload() wołają wątek obserwujący plik i handler POST /reload — nie mogą się przeplatać
+        self._reload_lock = threading.Lock()
+
+    def _after_tick(self, stats) -> None:
+        path = (self.cfg.get("metrics") or {}).get("textfile")
+        if path:
+            import metrics
+            metrics.REGISTRY.write_textfile(path)
+
+    # --- przeładowanie konfiguracji ---
+    def _config_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.config_path) if self.config_path else None
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """Przeładuj lokalizacje, progi alertów i powiadomienia; pozostałe klucze wymagają restartu."""
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self) -> None:
+        try:
+            cfg = apply_cli_overrides(load_config(self.config_path), self.args)
+            apply_alert_thresholds(cfg)
+        except Exception:
+            LOGGER.exception("Nieprawidłowy plik konfiguracyjny — zostawiam poprzednią konfigurację")
+            return
+        self.scheduler.update_locations(resolve_locations(cfg))
+        self.cfg["locations"] = cfg.get("locations")
+        self.cfg["alerts"] = cfg.get("alerts")
+        if self._data_service is not None:
+            self._data_service.set_locations(resolve_locations(cfg))
+        if cfg.get("notifications") != self.cfg.get("notifications"):
+            notify.configure(cfg.get("notifications"))
+            self.cfg["notifications"] = cfg.get("notifications")
+        self.reloads += 1
+        LOGGER.info("Przeładowano konfigurację z %s", self.config_path)
+
+    def _watch_config(self) -> None:
+        while not self._stop.wait(float(self.cfg.get("reload_check_s") or 5)):
+            mtime = self._config_mtime()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
+
+    # --- interfejs kontrolny ---
+    def status(self) -> Dict[str, Any]:
+        s = self.scheduler
+        last = s.last_stats
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "ticks": s.ticks,
+            "next_tick": s.next_tick,
+            "interval_s": s.interval_s,
+            "locations": [loc.get("name") or loc.get("id") for loc in s.locations],
+            "reloads": self.reloads,
+            "alert_thresholds": {"temp_low": Alert.ALERT_TEMP_LOW_THRESHOLD,
+                                 "wind": Alert.ALERT_WIND_THRESHOLD,
+                                 "precip_codes": sorted(Alert.ALERT_WEATHER_CODES_PRECIP)},
+            "alert_rules": [r.name for r in Alert.active_rules().rules],
+            "last_tick": last.__dict__ if last else None,
+            "profiler": profiler.PROFILER.status(),
+        }
+
+    def _make_handler(self):
+        from http.server import BaseHTTPRequestHandler
+        daemon = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _send(self, code: int, body: Dict[str, Any]) -> None:
+                raw = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/status":
+                    self._send(200, daemon.status())
+                elif self.path.rstrip("/") == "/metrics":
+                    import metrics
+                    raw = metrics.REGISTRY.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(raw)))
+                    self.end_headers()
+                    self.wfile.write(raw)
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                from urllib.parse import parse_qs, urlsplit
+                parts = urlsplit(self.path)
+                path = parts.path.rstrip("/")
+                query = parse_qs(parts.query)
+                if path == "/profile":
+                    try:
+                        profiler.PROFILER.arm(query.get("mode", ["stages"])[0],
+                                              int(query.get("cycles", ["1"])[0]))
+                    except ValueError as e:
+                        self._send(400, {"error": str(e)})
+                        return
+                    self._send(200, {"ok": True, "profiler": profiler.PROFILER.status()})
+                elif path == "/profile/stop":
+                    profiler.PROFILER.disarm()
+                    self._send(200, {"ok": True, "profiler": profiler.PROFILER.status()})
+                elif path == "/run":
+                    daemon.scheduler.trigger()
+                    self._send(202, {"ok": True, "action": "run"})
+                elif path == "/reload":
+                    daemon.reload()
+                    self._send(200, {"ok": True, "action": "reload"})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def log_message(self, fmt, *a):
+                LOGGER.debug("control: " + fmt, *a)
+
+        return _Handler
+
+    def start_control(self) -> None:
+        ctl = self.cfg.get("control") or {}
+        port = ctl.get("port")
+        if not port:
+            return
+        host = ctl.get("host") or "127.0.0.1"
+        from http.server import ThreadingHTTPServer
+        self._server = ThreadingHTTPServer((host, int(port)), self._make_handler())
+        threading.Thread(target=self._server.serve_forever, name="control", daemon=True).start()
+        LOGGER.info("Interfejs kontrolny: http://%s:%d/status", host, int(port))
+
+    def start_data_service(self) -> None:
+        ds = self.cfg.get("data_service") or {}
+        if not ds.get("port"):
+            return
+        from Api import _ensure_db
+        from data_service import DataService
+        _ensure_db()   # połączenia tylko do odczytu wymagają istniejącej bazy
+        self._data_service = DataService(self.scheduler.db_path, ds.get("host") or "127.0.0.1", int(ds["port"]),
+                                         locations=resolve_locations(self.cfg),
+                                         pool_size=int(ds.get("pool") or 4),
+                                         max_bytes=int(float(ds.get("cache_mb") or 64) * 2**20)).start()
+
+    # --- główna pętla ---
+    def _on_sigterm(self, signum, frame) -> None:
+        LOGGER.info("Otrzymano SIGTERM — kończę po bieżącym etapie")
+        self.scheduler.stop()
+
+    def run(self) -> None:
+        # zwykłe zatrzymanie usługi (systemd, docker, kill) ma przejść przez shutdown():
+        # dostarczenie zaległych powiadomień, zamknięcie puli, połączenia DB i serwerów
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+        self.start_control()
+        self.start_data_service()
+        threading.Thread(target=self._watch_config, name="config-watch", daemon=True).start()
+        try:
+            self.scheduler.run_forever()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.scheduler.stop()
+        notify.shutdown()
+        if self._data_service is not None:
+            self._data_service.stop()
+            self._data_service = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def run_daemon(args) -> None:
+    d = Daemon(getattr(args, "config", None) or DEFAULT_CONFIG_PATH, args)
+    try:
+        d.run()
+    except KeyboardInterrupt:
+        LOGGER.info("Przerwano przez użytkownika")
+        d.shutdown()
@@ -0,0 +1,477 @@
+"""Lokalna usługa HTTP tylko do odczytu: dane godzinowe, dzienne i alerty z data.db.
+
+Zamiast czytać data.db bezpośrednio (i konkurować z ingestem) albo czekać na zrzuty
+save_json, konsumenci pytają:
+
+    GET /locations                                     lokalizacje z zakresem danych
+    GET /hourly?location=1&start=...&end=...&limit=N   szereg godzinowy (kolumnowo)
+    GET /daily?location=1&start=YYYY-MM-DD&end=...     agregaty dzienne z tabeli hourly
+    GET /alerts?location=1,2&start=...&end=...&open=1  bloki alertów
+    GET /health                                        stan usługi (bez cache)
+
+- odczyt przez pulę połączeń tylko do odczytu (`mode=ro`) — usługa nigdy nie pisze,
+- gotowe odpowiedzi (JSON, wersja gzip i ETag) trzymane są w pamięci; unieważnia je
+  każdy commit innego połączenia (ingest, alerty) wykryty przez `PRAGMA data_version`
+  (sprawdzane najwyżej co `check_interval_s`),
+  a odpowiedzi, o które pytano przed zmianą, są od razu przeliczane w tle,
+  Cache jest ograniczony liczbą wpisów i łącznym rozmiarem (`max_bytes`); odpowiedź większa
+  niż `max_entry_bytes` (np. długi szereg z dużym `limit`) nie jest zapamiętywana,
+- `If-None-Match` -> 304 bez treści, `Accept-Encoding: gzip` -> skompresowana treść
+  (z własnym ETagiem z sufiksem `-gz`).
+
+Baza musi być w trybie WAL (czytelnicy nie blokują ingestu) — ustawia go Api._ensure_db,
+a przy uruchomieniu samodzielnym `main()` (połączenia `mode=ro` trybu zmienić nie mogą).
+
+Uruchomienie: sekcja "data_service" konfiguracji demona albo samodzielnie
+    python data_service.py --db data.db --port 8766
+Benchmark obciążeniowy: benchmarks/bench_data_service.py.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+
+LOGGER = logging.getLogger("meteofetch.data_service")
+
+REQUESTS = metrics.counter("meteofetch_data_service_requests", "Zapytania do usługi danych", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.histogram("meteofetch_data_service_request_seconds", "Czas obsługi zapytania",
+                                    ("endpoint",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+CACHE = metrics.counter("meteofetch_data_service_cache", "Trafienia/chybienia cache odpowiedzi", ("result",))
+INVALIDATIONS = metrics.counter("meteofetch_data_service_invalidations", "Unieważnienia cache po zmianie danych")
+
+MAX_LIMIT = 50000
+DEFAULT_LIMIT = 5000
+GZIP_MIN_BYTES = 512
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+HOURLY_COLUMNS = ("temperature", "rain", "snowfall", "wind_speed", "weather_code")
+
+
+class QueryError(ValueError):
+    """Nieprawidłowe parametry zapytania (HTTP 400)."""
+
+
+class ReadPool:
+    """Pula połączeń SQLite tylko do odczytu, współdzielona przez wątki serwera."""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(size, 1)):
+            self._pool.put(self._connect())
+        # osobne połączenie do sprawdzania wersji danych (PRAGMA data_version)
+        self._version_conn = self._connect()
+        self._version_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        # zapytanie nie zatrzymuje writera dłużej niż trwa — bez długich transakcji odczytu
+        conn.isolation_level = None
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def data_version(self) -> int:
+        """Rośnie po każdym commicie innego połączenia do tej bazy."""
+        with self._version_lock:
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._version_conn.close()
+
+
+# --- zapytania ---
+def _param(query: Dict[str, List[str]], name: str, default: Optional[str] = None) -> Optional[str]:
+    v = query.get(name)
+    return v[0] if v and v[0] != "" else default
+
+
+def _location(query: Dict[str, List[str]]) -> int:
+    v = _param(query, "location")
+    if v is None:
+        raise QueryError("brak parametru 'location'")
+    try:
+        return int(v)
+    except ValueError:
+        raise QueryError(f"nieprawidłowy 'location': {v!r}") from None
+
+
+def _limit(query: Dict[str, List[str]]) -> int:
+    try:
+        n = int(_param(query, "limit", str(DEFAULT_LIMIT)))
+    except ValueError:
+        raise QueryError("nieprawidłowy 'limit'") from None
+    return min(max(n, 1), MAX_LIMIT)
+
+
+def _end(value: str) -> str:
+    # end=YYYY-MM-DD obejmuje cały dzień
+    return value + "T23:59" if len(value) == 10 else value
+
+
+def _range_sql(column: str, query: Dict[str, List[str]]) -> Tuple[str, list]:
+    """Warunek zakresu dla start/end (włącznie; porównanie tekstowe jak w całym projekcie)."""
+    sql, args = "", []
+    if _param(query, "start"):
+        sql += f" AND {column}>=?"
+        args.append(_param(query, "start"))
+    if _param(query, "end"):
+        sql += f" AND {column}<=?"
+        args.append(_end(_param(query, "end")))
+    return sql, args
+
+
+def query_locations(conn: sqlite3.Connection, names: Dict[int, str], query: Dict[str, List[str]]) -> Dict[str, Any]:
+    rows = conn.execute("SELECT location_id, COUNT(*), MIN(timestamp), MAX(timestamp) FROM hourly "
+                        "GROUP BY location_id ORDER BY location_id").fetchall()
+    return {"locations": [{"id": r[0], "name": names.get(r[0]), "hours": r[1], "first": r[2], "last": r[3]}
+                          for r in rows]}
+
+
+def query_hourly(conn: sqlite3.Connection, names: Dict[int, str], query: Dict[str, List[str]]) -> Dict[str, Any]:
+    loc = _location(query)
+    rng, args = _range_sql("timestamp", query)
+    rows = conn.execute(
+        f"SELECT timestamp, {', '.join(HOURLY_COLUMNS)} FROM hourly WHERE location_id=?{rng} "
+        f"ORDER BY timestamp LIMIT ?", (loc, *args, _limit(query))).fetchall()
+    out: Dict[str, Any] = {"location_id": loc, "name": names.get(loc), "time": [r[0] for r in rows]}
+    for i, col in enumerate(HOURLY_COLUMNS, start=1):
+        out[col] = [r[i] for r in rows]
+    return out
+
+
+def query_daily(conn: sqlite3.Connection, names: Dict[int, str], query: Dict[str, List[str]]) -> Dict[str, Any]:
+    loc = _location(query)
+    # zakres na samej kolumnie timestamp (start >= "YYYY-MM-DD", end <= "YYYY-MM-DDT23:59"),
+    # nie na substr(...) — inaczej SQLite nie użyje klucza (location_id, timestamp)
+    rng, args = _range_sql("timestamp", query)
+    rows = conn.execute(
+        "SELECT substr(timestamp, 1, 10) AS day, MIN(temperature), MAX(temperature), "
+        "SUM(COALESCE(rain, 0)), SUM(COALESCE(snowfall, 0)), MAX(wind_speed), COUNT(*) "
+        f"FROM hourly WHERE location_id=?{rng} GROUP BY day ORDER BY day LIMIT ?",
+        (loc, *args, _limit(query))).fetchall()
+    keys = ("date", "temperature_min", "temperature_max", "rain_sum", "snowfall_sum", "wind_speed_max", "hours")
+    out: Dict[str, Any] = {"location_id": loc, "name": names.get(loc)}
+    for i, k in enumerate(keys):
+        out[k] = [r[i] for r in rows]
+    return out
+
+
+def query_alerts(conn: sqlite3.Connection, names: Dict[int, str], query: Dict[str, List[str]]) -> Dict[str, Any]:
+    sql, args = "SELECT id, location_id, timestamp, end_timestamp, metric, value, message, created_at, closed_at " \
+                "FROM alerts WHERE 1=1", []
+    if _param(query, "location"):
+        try:
+            locs = [int(x) for x in _param(query, "location").split(",")]
+        except ValueError:
+            raise QueryError("nieprawidłowy 'location'") from None
+        sql += f" AND location_id IN ({','.join('?' * len(locs))})"
+        args += locs
+    # blok nachodzący na [start, end]
+    if _param(query, "start"):
+        sql += " AND COALESCE(end_timestamp, timestamp)>=?"
+        args.append(_param(query, "start"))
+    if _param(query, "end"):
+        sql += " AND timestamp<=?"
+        args.append(_end(_param(query, "end")))
+    if _param(query, "open") in ("1", "true"):
+        # otwarty = niezamknięty i jeszcze trwający (blok kończący się w bieżącej godzinie się liczy);
+        # cache odpowiedzi jest czyszczony co pełną godzinę (ResponseCache._check_version)
+        sql += " AND closed_at IS NULL AND end_timestamp>=?"
+        args.append(time.strftime("%Y-%m-%dT%H:00", time.gmtime()))
+    rows = conn.execute(sql + " ORDER BY timestamp, location_id LIMIT ?", (*args, _limit(query))).fetchall()
+    keys = ("id", "location_id", "start", "end", "metric", "value", "message", "created_at", "closed_at")
+    alerts = [dict(zip(keys, r)) for r in rows]
+    for a in alerts:
+        a["name"] = names.get(a["location_id"])
+    return {"alerts": alerts}
+
+
+ENDPOINTS = {"/locations": query_locations, "/hourly": query_hourly, "/daily": query_daily, "/alerts": query_alerts}
+
+
+class Response:
+    __slots__ = ("body", "gzipped", "etag", "etag_gzip", "status")
+
+    def __init__(self, status: int, doc: Dict[str, Any]):
+        self.status = status
+        self.body = json.dumps(doc, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=6) if len(self.body) >= GZIP_MIN_BYTES else None
+        digest = hashlib.sha1(self.body).hexdigest()[:20]
+        self.etag = f'"{digest}"'
+        # inna reprezentacja (Content-Encoding) = inny ETag, inaczej pośrednik pomyli wersje
+        self.etag_gzip = f'"{digest}-gz"'
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+
+class ResponseCache:
+    """Gotowe odpowiedzi (LRU) ważne dla jednej wersji danych, godziny (UTC) i listy nazw lokalizacji.
+
+    Ograniczenie: `max_entries` wpisów i `max_bytes` łącznie (treść + gzip); odpowiedzi
+    większe niż `max_entry_bytes` (domyślnie 1/8 `max_bytes`) są liczone za każdym razem.
+    """
+
+    def __init__(self, pool: ReadPool, names: Optional[Dict[int, str]] = None, max_entries: int = 512,
+                 check_interval_s: float = 0.25, max_bytes: int = CACHE_MAX_BYTES,
+                 max_entry_bytes: Optional[int] = None):
+        self.pool = pool
+        self.names = dict(names or {})
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self._bytes = 0
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Response]" = OrderedDict()
+        self._version = pool.data_version()
+        self._hour = int(time.time() // 3600)
+        self._epoch = 0   # rośnie przy każdym czyszczeniu — odpowiedzi liczone wcześniej nie trafiają do cache
+        self._checked_at = time.monotonic()
+        self._warming = False
+
+    @staticmethod
+    def key(path: str, query: Dict[str, List[str]]) -> tuple:
+        return (path,) + tuple(sorted((k, tuple(v)) for k, v in query.items()))
+
+    def _check_version(self) -> None:
+        # PRAGMA data_version najwyżej co check_interval_s — przy setkach zapytań/s to pomijalny koszt
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval_s:
+            return
+        self._checked_at = now
+        version = self.pool.data_version()
+        hour = int(time.time() // 3600)
+        with self._lock:
+            if (version, hour) == (self._version, self._hour):
+                return
+            self._version, self._hour = version, hour
+            hot = self._clear()
+        INVALIDATIONS.inc()
+        LOGGER.debug("Dane zmienione (data_version=%s) — przeliczam %d odpowiedzi", version, len(hot))
+        if hot and not self._warming:
+            self._warming = True
+            threading.Thread(target=self._warm, args=(hot,), name="data-service-warm", daemon=True).start()
+
+    def _clear(self) -> List[tuple]:
+        # wołane pod self._lock; zwraca klucze, o które pytano (do przeliczenia w tle)
+        hot = list(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        self._epoch += 1
+        return hot
+
+    def set_names(self, names: Dict[int, str]) -> None:
+        """Nowe nazwy lokalizacji (np. po przeładowaniu konfiguracji) — odpowiedzi z nazwami są nieaktualne."""
+        with self._lock:
+            self.names = dict(names)
+            self._clear()
+
+    def _warm(self, keys: List[tuple]) -> None:
+        try:
+            for key in reversed(keys):   # najpierw ostatnio używane
+                self._build(key)
+        except Exception:
+            LOGGER.exception("Błąd przeliczania odpowiedzi")
+        finally:
+            self._warming = False
+
+    def _build(self, key: tuple) -> Response:
+        with self._lock:
+            epoch = self._epoch
+        query = {k: list(v) for k, v in key[1:]}
+        try:
+            with self.pool.connection() as conn:
+                resp = Response(200, ENDPOINTS[key[0]](conn, self.names, query))
+        except QueryError as e:
+            resp = Response(400, {"error": str(e)})
+        with self._lock:
+            # odpowiedź sprzed zmiany danych (lub nazw) nie trafia do cache, zbyt duża też nie
+            if epoch == self._epoch and resp.size <= self.max_entry_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old.size
+                self._entries[key] = resp
+                self._bytes += resp.size
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    self._bytes -= self._entries.popitem(last=False)[1].size
+            elif epoch == self._epoch:
+                CACHE.inc(result="too_large")
+        return resp
+
+    def get(self, path: str, query: Dict[str, List[str]]) -> Response:
+        self._check_version()
+        key = self.key(path, query)
+        with self._lock:
+            resp = self._entries.get(key)
+            if resp is not None:
+                self._entries.move_to_end(key)
+        CACHE.inc(result="hit" if resp is not None else "miss")
+        return resp if resp is not None else self._build(key)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"data_version": self._version, "cached": len(self._entries), "cached_bytes": self._bytes}
+
+
+class DataService:
+    def __init__(self, db_path: str, host: str = "127.0.0.1", port: int = 8766,
+                 locations: Optional[List[Dict[str, Any]]] = None, pool_size: int = 4, max_entries: int = 512,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.pool = ReadPool(db_path, pool_size)
+        self.cache = ResponseCache(self.pool, {loc["id"]: loc.get("name") for loc in locations or []}, max_entries,
+                                   max_bytes=max_bytes)
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_locations(self, locations: List[Dict[str, Any]]) -> None:
+        self.cache.set_names({loc["id"]: loc.get("name") for loc in locations})
+
+    def _make_handler(self):
+        service = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive: bez nowego połączenia TCP na każde zapytanie
+            # nagłówki i treść idą osobnymi zapisami — bez TCP_NODELAY Nagle + opóźniony ACK to ~40 ms
+            disable_nagle_algorithm = True
+
+            def _send(self, resp: Response, endpoint: str) -> None:
+                use_gzip = resp.gzipped is not None and "gzip" in (self.headers.get("Accept-Encoding") or "")
+                etag = resp.etag_gzip if use_gzip else resp.etag
+                if resp.status == 200 and etag in (self.headers.get("If-None-Match") or ""):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.send_header("Vary", "Accept-Encoding")
+                    self.end_headers()
+                    REQUESTS.inc(endpoint=endpoint, status="304")
+                    return
+                body = resp.gzipped if use_gzip else resp.body
+                self.send_response(resp.status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if resp.status == 200:
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "no-cache")
+                    self.send_header("Vary", "Accept-Encoding")
+                if use_gzip:
+                    self.send_header("Content-Encoding", "gzip")
+                self.end_headers()
+                self.wfile.write(body)
+                REQUESTS.inc(endpoint=endpoint, status=str(resp.status))
+
+            def do_GET(self):
+                t0 = time.perf_counter()
+                parts = urlsplit(self.path)
+                path = parts.path.rstrip("/") or "/"
+                endpoint = path if path in ENDPOINTS or path == "/health" else "other"
+                try:
+                    if path == "/health":
+                        self._send(Response(200, {"status": "ok", **service.cache.status()}), endpoint)
+                    elif path in ENDPOINTS:
+                        self._send(service.cache.get(path, parse_qs(parts.query)), endpoint)
+                    else:
+                        self._send(Response(404, {"error": "not found",
+                                                  "endpoints": sorted(ENDPOINTS) + ["/health"]}), endpoint)
+                except sqlite3.Error as e:
+                    LOGGER.exception("Błąd odczytu bazy")
+                    self._send(Response(503, {"error": f"baza niedostępna: {e}"}), endpoint)
+                finally:
+                    REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint)
+
+            def _read_only(self):
+                self.close_connection = True   # nieprzeczytana treść zapytania nie może trafić do kolejnego
+                self._send(Response(405, {"error": "usługa tylko do odczytu"}), "other")
+
+            do_POST = do_PUT = do_DELETE = do_PATCH = _read_only
+
+            def log_message(self, fmt, *a):
+                LOGGER.debug("data_service: " + fmt, *a)
+
+        return _Handler
+
+    def start(self) -> "DataService":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="data-service", daemon=True)
+        self._thread.start()
+        LOGGER.info("Usługa danych: %s/hourly?location=<id>", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self.pool.close()
+
+    def __enter__(self) -> "DataService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def ensure_wal(db_path: str) -> str:
+    """Przełącz bazę w tryb WAL (trwały, zapisany w pliku); zwraca tryb dziennika.
+
+    Bez WAL czytelnicy usługi blokują commit ingestu i odwrotnie. W demonie robi to
+    Api._ensure_db; połączenia `mode=ro` puli trybu zmienić nie mogą.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    finally:
+        conn.close()
+    if str(mode).lower() != "wal":
+        LOGGER.warning("Baza %s nie jest w trybie WAL (journal_mode=%s) — odczyty mogą blokować ingest", db_path, mode)
+    return mode
+
+
+def main() -> None:
+    import os
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.db"))
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--pool", type=int, default=4, help="liczba połączeń tylko do odczytu")
+    p.add_argument("--cache-mb", type=float, default=CACHE_MAX_BYTES / 2**20, help="limit pamięci cache odpowiedzi (MiB)")
+    args = p.parse_args()
+    if not os.path.exists(args.db):
+        p.error(f"brak bazy {args.db} (tworzy ją ingest: Main.py / demon)")
+    logging.basicConfig(level=logging.INFO)
+    ensure_wal(args.db)
+    srv = DataService(args.db, args.host, args.port, pool_size=args.pool, max_bytes=int(args.cache_mb * 2**20))
+    srv.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,6 @@ import time
 import threading
 import logging
 from typing import Optional, Any, Dict
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 LOGGER = logging.getLogger("meteofetch.http_client")
 
@@ -32,6 +29,11 @@ class RateLimiter:
 
 class HTTPClient:
     def __init__(self, retries: int = 3, backoff_factor: float = 0.5, rate_per_sec: float = 1.0):
+        # import przy pierwszym utworzeniu klienta, nie przy imporcie modułu
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        self._request_exc = requests.exceptions.RequestException
         self.session = requests.Session()
         retries_cfg = Retry(
             total=retries,
@@ -50,7 +52,7 @@ class HTTPClient:
             r = self.session.get(url, params=params, timeout=(5, timeout))
             r.raise_for_status()
             return r.json()
-        except requests.exceptions.RequestException:
+        except self._request_exc:
             LOGGER.exception("HTTP GET failed: %s", url)
             raise
 
@@ -60,7 +62,7 @@ class HTTPClient:
             r = self.session.post(url, json=json_payload, timeout=(5, timeout))
             r.raise_for_status()
             return r.json()
-        except requests.exceptions.RequestException:
+        except self._request_exc:
             LOGGER.exception("HTTP POST failed: %s", url)
             raise
 
@@ -0,0 +1,260 @@
+"""Lekki rejestr metryk (counter / gauge / histogram) z eksportem w formacie Prometheus.
+
+- metryki tworzone są raz (na poziomie modułu) przez `counter()`, `gauge()`, `histogram()`,
+- `inc()` / `set()` / `observe()` to kilka operacji pod jednym lockiem — koszt pomijalny
+  w porównaniu z zapytaniem HTTP czy commitem SQLite (instrumentujemy wywołania, nie wiersze),
+- eksport: `render()` (tekst Prometheus), `write_textfile()` (atomowo, dla node_exporter
+  textfile collector) oraz GET /metrics w interfejsie kontrolnym demona,
+- `snapshot()` + `diff()` dają podsumowanie per cykl (przyrosty od poprzedniego cyklu).
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(v: float) -> str:
+    v = float(v)
+    if v == float("inf"):
+        return "+Inf"
+    if v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if not self.labelnames:
+            return ()
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + "_total", _fmt_labels(self.labelnames, k), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _fmt_labels(self.labelnames, k), v) for k, v in items]
+
+
+class _Timer:
+    def __init__(self, hist: "Histogram", labels: Dict[str, str]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.hist.observe(self.elapsed, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str = "", labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # per klucz etykiet: [liczniki kubełków (nieskumulowane, ostatni = +Inf), suma, licznik]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            st[0][idx] += 1
+            st[1] += value
+            st[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Context manager: zmierz czas bloku i dodaj obserwację."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        st = self._values.get(self._key(labels))
+        return st[2] if st else 0
+
+    def sum(self, **labels) -> float:
+        st = self._values.get(self._key(labels))
+        return st[1] if st else 0.0
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        out = []
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        for key, (counts, total, n) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                out.append((self.name + "_bucket",
+                            _fmt_labels(self.labelnames, key, f'le="{_fmt_num(bound)}"'), acc))
+            out.append((self.name + "_sum", _fmt_labels(self.labelnames, key), total))
+            out.append((self.name + "_count", _fmt_labels(self.labelnames, key), n))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames: Iterable[str], **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help, labelnames, **kw)
+            elif not isinstance(m, cls):
+                raise ValueError(f"Metryka {name} już istnieje jako {m.kind}")
+            return m
+
+    def counter(self, name: str, help: str = "", labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str = "", labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Tekst w formacie Prometheus exposition (0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for m in metrics:
+            samples = m.samples()
+            if not samples:
+                continue
+            # w formacie 0.0.4 nagłówek licznika nosi nazwę próbki (z sufiksem _total)
+            header = m.name + "_total" if m.kind == "counter" else m.name
+            if m.help:
+                lines.append(f"# HELP {header} {m.help}")
+            lines.append(f"# TYPE {header} {m.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_fmt_num(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Zapis atomowy (plik tymczasowy + rename), żeby scraper nie przeczytał połowy pliku."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Płaski słownik: liczniki oraz _sum/_count histogramów (bez kubełków i gauge)."""
+        out: Dict[str, float] = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            if m.kind == "gauge":
+                continue
+            for name, labels, value in m.samples():
+                if not name.endswith("_bucket"):
+                    out[name + labels] = value
+        return out
+
+
+def diff(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    """Przyrosty między dwoma snapshotami (pomija zerowe)."""
+    out = {}
+    for k, v in after.items():
+        d = v - before.get(k, 0.0)
+        if d:
+            out[k] = d
+    return out
+
+
+def format_summary(delta: Dict[str, float], limit: int = 20) -> str:
+    items = sorted(delta.items())[:limit]
+    return ", ".join(f"{k}={v:.4g}" for k, v in items) or "(brak zmian)"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str = "", labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.counter(name, help, labelnames)
+
+
+def gauge(name: str, help: str = "", labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.gauge(name, help, labelnames)
+
+
+def histogram(name: str, help: str = "", labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, help, labelnames, buckets)
+
+
+# wspólny histogram dla Login.timed (etykieta stage = nazwa przekazana do timed)
+STAGE_SECONDS = histogram("meteofetch_stage_seconds", "Czas etapów mierzonych przez Login.timed", ("stage",))
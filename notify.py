@@ -0,0 +1,261 @@
+"""Asynchroniczne powiadomienia o nowych alertach.
+
+- `submit()` (wołane z analizy alertów w Alert.py tylko dla NOWYCH alertów) wkłada
+  alert do ograniczonej kolejki bez blokowania — cykl pobierania nigdy nie czeka,
+- wątek koalescencji zbiera alerty przez `batch_window_s` i łączy je w jedno
+  powiadomienie na lokalizację (kilka bloków tej samej góry = jedna wiadomość),
+- każdy sink ma własny wątek i kolejkę, więc wolny webhook nie opóźnia zapisu do pliku;
+  dostarczenie jest ponawiane z wykładniczym backoffem,
+- sinki: FileSink (JSON lines), WebhookSink (POST JSON), SmtpSink (e-mail, np. lokalny
+  serwer testowy `python -m aiosmtpd -n -l localhost:1025`).
+
+Metryki: głębokość kolejek, opóźnienie dostarczenia (od wykrycia do sinka), błędy.
+Bez `configure()` / `start()` wywołanie `submit()` nic nie robi.
+"""
+import abc
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+LOGGER = logging.getLogger("meteofetch.notify")
+
+QUEUE_DEPTH = metrics.gauge("meteofetch_notify_queue_depth", "Alerty czekające na koalescencję/dostarczenie", ("queue",))
+DELIVERY_SECONDS = metrics.histogram("meteofetch_notify_delivery_seconds",
+                                     "Opóźnienie od wykrycia alertu do dostarczenia", ("sink",),
+                                     buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+DELIVERED = metrics.counter("meteofetch_notify_delivered", "Dostarczone powiadomienia", ("sink",))
+FAILURES = metrics.counter("meteofetch_notify_failures", "Nieudane próby dostarczenia", ("sink",))
+DROPPED = metrics.counter("meteofetch_notify_dropped", "Alerty odrzucone przy pełnej kolejce", ("queue",))
+
+
+# --- sinki ---
+class Sink(abc.ABC):
+    name = "sink"
+
+    @abc.abstractmethod
+    def deliver(self, batch: List[Dict[str, Any]]) -> None:
+        """Dostarcz paczkę powiadomień; wyjątek = ponowienie."""
+
+
+class FileSink(Sink):
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def deliver(self, batch: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for n in batch:
+                f.write(json.dumps(n, ensure_ascii=False) + "\n")
+
+
+class WebhookSink(Sink):
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10.0, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+
+    def deliver(self, batch: List[Dict[str, Any]]) -> None:
+        import urllib.request
+        body = json.dumps({"notifications": batch}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json; charset=utf-8", **self.headers})
+        with urllib.request.urlopen(req, timeout=self.timeout) as r:
+            if r.status >= 300:
+                raise RuntimeError(f"webhook zwrócił {r.status}")
+
+
+class SmtpSink(Sink):
+    name = "smtp"
+
+    def __init__(self, to: List[str], host: str = "localhost", port: int = 1025,
+                 sender: str = "meteofetch@localhost", timeout: float = 10.0):
+        self.to = list(to)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.timeout = timeout
+
+    def deliver(self, batch: List[Dict[str, Any]]) -> None:
+        import smtplib
+        from email.message import EmailMessage
+        msg = EmailMessage()
+        names = sorted({n.get("location_name") or str(n.get("location_id")) for n in batch})
+        msg["Subject"] = f"[meteofetch] Alerty pogodowe: {', '.join(names)}"
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(self.to)
+        msg.set_content("\n\n".join("\n".join(a["message"] for a in n["alerts"]) for n in batch))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as s:
+            s.send_message(msg)
+
+
+class _SinkWorker(threading.Thread):
+    def __init__(self, sink: Sink, max_retries: int, backoff_s: float, max_queue: int):
+        super().__init__(name=f"notify-{sink.name}", daemon=True)
+        self.sink = sink
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=max_queue)
+
+    def put(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            DROPPED.inc(len(batch), queue=self.sink.name)
+            LOGGER.error("Kolejka sinka %s pełna — odrzucono %d powiadomień", self.sink.name, len(batch))
+        QUEUE_DEPTH.set(self.queue.qsize(), queue=self.sink.name)
+
+    def run(self) -> None:
+        while True:
+            batch = self.queue.get()
+            QUEUE_DEPTH.set(self.queue.qsize(), queue=self.sink.name)
+            if batch is None:
+                return
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.sink.deliver(batch)
+                    now = time.time()
+                    for n in batch:
+                        DELIVERY_SECONDS.observe(now - n["first_detected_at"], sink=self.sink.name)
+                    DELIVERED.inc(len(batch), sink=self.sink.name)
+                    break
+                except Exception as e:
+                    FAILURES.inc(sink=self.sink.name)
+                    if attempt >= self.max_retries:
+                        LOGGER.error("Nie dostarczono %d powiadomień do %s: %s", len(batch), self.sink.name, e)
+                        break
+                    time.sleep(self.backoff_s * (2 ** attempt))
+
+
+class Dispatcher:
+    def __init__(self, sinks: List[Sink], batch_window_s: float = 5.0, max_queue: int = 10000,
+                 max_retries: int = 3, backoff_s: float = 1.0):
+        self.batch_window_s = batch_window_s
+        self._in: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._workers = [_SinkWorker(s, max_retries, backoff_s, max_queue) for s in sinks]
+        self._thread = threading.Thread(target=self._coalesce_loop, name="notify-coalesce", daemon=True)
+        self._deadline: Optional[float] = None   # termin zamknięcia ustawiany przez flush()
+
+    def start(self) -> "Dispatcher":
+        for w in self._workers:
+            w.start()
+        self._thread.start()
+        return self
+
+    def submit(self, alert: Dict[str, Any]) -> bool:
+        """Nieblokujące dodanie alertu; False, gdy kolejka pełna (alert odrzucony)."""
+        alert.setdefault("detected_at", time.time())
+        try:
+            self._in.put_nowait(alert)
+        except queue.Full:
+            DROPPED.inc(queue="in")
+            return False
+        QUEUE_DEPTH.set(self._in.qsize(), queue="in")
+        return True
+
+    def _flush(self, pending: Dict[Any, Dict[str, Any]]) -> None:
+        if not pending:
+            return
+        batch = list(pending.values())
+        pending.clear()
+        for w in self._workers:
+            w.put(batch)
+
+    def _coalesce_loop(self) -> None:
+        pending: Dict[Any, Dict[str, Any]] = {}
+        window_start = None
+        while True:
+            timeout = None
+            if window_start is not None:
+                timeout = max(window_start + self.batch_window_s - time.time(), 0.0)
+            try:
+                item = self._in.get(timeout=timeout)
+            except queue.Empty:
+                item = ...
+            QUEUE_DEPTH.set(self._in.qsize(), queue="in")
+            if item is None:
+                self._flush(pending)
+                for w in self._workers:
+                    try:
+                        w.queue.put(None, timeout=max((self._deadline or time.time()) - time.time(), 0.0))
+                    except queue.Full:
+                        LOGGER.error("Kolejka sinka %s pełna przy zamykaniu — %d paczek niedostarczonych",
+                                     w.sink.name, w.queue.qsize())
+                return
+            if item is not ...:
+                key = item.get("location_id")
+                n = pending.get(key)
+                if n is None:
+                    n = pending[key] = {"location_id": key, "location_name": item.get("location_name"),
+                                        "first_detected_at": item["detected_at"], "alerts": []}
+                n["alerts"].append({k: v for k, v in item.items() if k not in ("location_id", "location_name")})
+                if window_start is None:
+                    window_start = time.time()
+            if window_start is not None and time.time() - window_start >= self.batch_window_s:
+                self._flush(pending)
+                window_start = None
+
+    def flush(self, timeout: float = 30.0) -> None:
+        """Zamknij dispatcher: dostarcz zaległe powiadomienia (czekając najwyżej `timeout` s)."""
+        deadline = self._deadline = time.time() + timeout
+        try:
+            self._in.put(None, timeout=timeout)
+        except queue.Full:
+            LOGGER.error("Kolejka powiadomień pełna przy zamykaniu (%.1f s) — %d alertów niedostarczonych",
+                         timeout, self._in.qsize())
+            return
+        self._thread.join(max(deadline - time.time(), 0.0))
+        for w in self._workers:
+            w.join(max(deadline - time.time(), 0.0))
+
+
+_dispatcher: Optional[Dispatcher] = None
+
+
+def build_sinks(cfg: Dict[str, Any]) -> List[Sink]:
+    """Sinki z sekcji "notifications" konfiguracji (patrz meteofetch.example.json)."""
+    sinks: List[Sink] = []
+    if cfg.get("file"):
+        sinks.append(FileSink(cfg["file"]))
+    wh = cfg.get("webhook") or {}
+    if wh.get("url"):
+        sinks.append(WebhookSink(wh["url"], timeout=float(wh.get("timeout", 10.0)), headers=wh.get("headers")))
+    smtp = cfg.get("smtp") or {}
+    if smtp.get("to"):
+        sinks.append(SmtpSink(smtp["to"], host=smtp.get("host", "localhost"), port=int(smtp.get("port", 1025)),
+                              sender=smtp.get("from", "meteofetch@localhost")))
+    return sinks
+
+
+def configure(cfg: Optional[Dict[str, Any]]) -> Optional[Dispatcher]:
+    """Uruchom globalny dispatcher wg konfiguracji; bez sinków powiadomienia są wyłączone."""
+    global _dispatcher
+    shutdown()
+    sinks = build_sinks(cfg or {})
+    if not sinks:
+        return None
+    _dispatcher = Dispatcher(sinks, batch_window_s=float((cfg or {}).get("batch_window_s", 5.0)),
+                             max_retries=int((cfg or {}).get("max_retries", 3))).start()
+    LOGGER.info("Powiadomienia: %s", ", ".join(s.name for s in sinks))
+    return _dispatcher
+
+
+def submit(alert: Dict[str, Any]) -> bool:
+    d = _dispatcher
+    return d.submit(alert) if d is not None else False
+
+
+def shutdown(timeout: float = 30.0) -> None:
+    global _dispatcher
+    d, _dispatcher = _dispatcher, None
+    if d is not None:
+        d.flush(timeout)
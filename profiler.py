@@ -0,0 +1,227 @@
+"""Tryb profilowania cykli pobierania (`--profile`, albo POST /profile w trybie demona).
+
+Tryby:
+  - "stages"   — tylko czasy etapów (wall + CPU wątku): throttle, http, decode, store,
+                 store_commit, alert_load, alerts, alert_commit, backup; praktycznie
+                 bez narzutu,
+  - "cprofile" — dodatkowo deterministyczny profil cProfile wątku wykonującego cykl
+                 (w trybie --once to cały cykl; w schedulerze wątek "db" nie jest objęty),
+  - "sampling" — dodatkowo profil próbkujący wszystkie wątki (sys._current_frames),
+                 zapisywany jako "folded stacks" (flamegraph.pl / speedscope / inferno).
+
+Wyniki trafiają do `data/profiles/`: `<nazwa>.txt` (tabela etapów + top-N hotspotów)
+oraz `<nazwa>.folded` (sampling) lub `<nazwa>.pstats` (cprofile).
+
+Etapy mogą się zagnieżdżać (np. alert_commit wewnątrz alerts), więc suma % wall
+w tabeli może przekroczyć 100%.
+
+Gdy profiler nie jest uzbrojony, `stage()` zwraca współdzielony pusty context manager,
+więc wywołania na gorących ścieżkach nic nie kosztują.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+LOGGER = logging.getLogger("meteofetch.profiler")
+
+MODES = ("stages", "cprofile", "sampling")
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), "data", "profiles")
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("prof", "name", "wall", "cpu")
+
+    def __init__(self, prof: "CycleProfiler", name: str):
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.prof._add_stage(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+        return False
+
+
+class _Sampler(threading.Thread):
+    """Próbkuje stosy wszystkich wątków co `interval` s i zlicza je w formacie folded."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiler-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: _Counter = _Counter()
+        self.leaves: _Counter = _Counter()
+        self.samples = 0
+        self._stop_evt = threading.Event()
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop_evt.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                self.leaves[stack[0]] += 1
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join(timeout=5)
+
+
+class CycleProfiler:
+    def __init__(self, out_dir: str = PROFILE_DIR, top_n: int = 25, sample_interval: float = 0.005):
+        self.out_dir = out_dir
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.mode: Optional[str] = None
+        self.cycles_left: Optional[int] = None   # None = bez limitu
+        self.last_output: Optional[str] = None
+        self._active = False
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+        self._cprofile = None
+        self._sampler: Optional[_Sampler] = None
+
+    # --- sterowanie (wołane także z wątku interfejsu kontrolnego) ---
+    def arm(self, mode: str = "stages", cycles: Optional[int] = 1) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Nieznany tryb profilowania: {mode} (dostępne: {', '.join(MODES)})")
+        self.mode = mode
+        self.cycles_left = cycles if cycles and cycles > 0 else None
+        LOGGER.info("Profiler uzbrojony: tryb=%s cykle=%s", mode, self.cycles_left or "bez limitu")
+
+    def disarm(self) -> None:
+        self.mode = None
+        self.cycles_left = None
+
+    @property
+    def armed(self) -> bool:
+        return self.mode is not None
+
+    def status(self) -> Dict[str, object]:
+        return {"mode": self.mode, "cycles_left": self.cycles_left,
+                "active": self._active, "last_output": self.last_output}
+
+    # --- etapy ---
+    def stage(self, name: str):
+        if not self._active:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def _add_stage(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            st = self._stages.setdefault(name, [0.0, 0.0, 0])
+            st[0] += wall
+            st[1] += cpu
+            st[2] += 1
+
+    # --- cykl ---
+    def begin_cycle(self) -> bool:
+        """Rozpocznij profil cyklu, jeśli profiler jest uzbrojony. Zwraca True, gdy aktywny."""
+        mode = self.mode
+        if mode is None or self._active:
+            return False
+        self._stages = {}
+        if mode == "cprofile":
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif mode == "sampling":
+            self._sampler = _Sampler(self.sample_interval)
+            self._sampler.start()
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+        self._active = True
+        return True
+
+    def end_cycle(self, label: str = "cycle") -> Optional[str]:
+        """Zakończ profil cyklu i zapisz wyniki; zwraca ścieżkę pliku podsumowania."""
+        if not self._active:
+            return None
+        wall = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._cpu0
+        self._active = False
+        mode = self.mode or "stages"
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{label}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')}")
+
+        lines = [f"# profil cyklu ({mode}): wall={wall:.3f}s cpu(proces)={cpu:.3f}s", "",
+                 f"{'etap':<16}{'wall[s]':>10}{'cpu[s]':>10}{'wywołań':>10}{'% wall':>9}"]
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda kv: kv[1][0], reverse=True)
+        for name, (s_wall, s_cpu, n) in stages:
+            share = 100.0 * s_wall / wall if wall > 0 else 0.0
+            lines.append(f"{name:<16}{s_wall:>10.3f}{s_cpu:>10.3f}{n:>10d}{share:>8.1f}%")
+
+        if self._cprofile is not None:
+            import io
+            import pstats
+            self._cprofile.disable()
+            self._cprofile.dump_stats(base + ".pstats")
+            buf = io.StringIO()
+            pstats.Stats(self._cprofile, stream=buf).sort_stats("cumulative").print_stats(self.top_n)
+            lines += ["", f"# top {self.top_n} (cProfile, cumulative) — pełny profil: {base}.pstats", buf.getvalue()]
+            self._cprofile = None
+
+        if self._sampler is not None:
+            self._sampler.stop()
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self._sampler.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            total = sum(self._sampler.leaves.values()) or 1
+            lines += ["", f"# top {self.top_n} (sampling, self) — {self._sampler.samples} próbek, "
+                          f"flamegraph: {base}.folded"]
+            for frame, count in self._sampler.leaves.most_common(self.top_n):
+                lines.append(f"{100.0 * count / total:6.1f}%  {count:6d}  {frame}")
+            self._sampler = None
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.last_output = base + ".txt"
+        LOGGER.info("Zapisano profil cyklu: %s", self.last_output)
+
+        if self.cycles_left is not None:
+            self.cycles_left -= 1
+            if self.cycles_left <= 0:
+                self.disarm()
+        return self.last_output
+
+
+PROFILER = CycleProfiler()
+
+
+def stage(name: str):
+    """Skrót: `with profiler.stage("store"): ...` na globalnym profilerze."""
+    return PROFILER.stage(name)
@@ -0,0 +1,279 @@
+"""Deklaratywne reguły alertów kompilowane do predykatów kolumnowych.
+
+Reguła (JSON, sekcja "alerts.rules" konfiguracji):
+
+    {"name": "wiatr", "when": {"var": "wind_speed", "op": ">", "value": 35}, "for_hours": 3,
+     "message": "wiatr do {value:.0f} m/s", "report": "wind_speed", "agg": "max"}
+
+Warunki ("when"):
+  - porównanie:    {"var": V, "op": "<|<=|>|>=|==|!=|in", "value": X}
+  - zmiana:        {"var": V, "change": OP, "value": X, "over_hours": K}   (v[i] - v[i-K] OP X)
+  - kombinacje:    {"all": [...]}, {"any": [...]}, {"not": {...}}
+  - "for_hours": N (na poziomie reguły albo warunku) — spełnione tylko w ciągach >= N godzin.
+
+Progi per lokalizacja: "value": {"default": -15, "1": -20} (klucz = location_id).
+Zmienne: temperature, rain, snowfall, wind_speed, weather_code oraz pochodna precip
+(rain + snowfall).
+
+Reguły są kompilowane raz (`compile_rules`) do funkcji działających na całych kolumnach
+(jedna list comprehension na predykat zamiast rozgałęzień w pętli po godzinach), a
+`RuleSet.evaluate_all` ocenia wszystkie lokalizacje w jednym przebiegu.
+"""
+import hashlib
+import json
+import operator
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+VARIABLES = ("temperature", "rain", "snowfall", "wind_speed", "weather_code", "precip")
+
+_OPS: Dict[str, Callable[[Any, Any], bool]] = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne,
+}
+_AGGS: Dict[str, Callable[[List[float]], float]] = {"min": min, "max": max, "sum": sum}
+
+Columns = Dict[str, List[Any]]
+Predicate = Callable[[Columns, str], List[bool]]
+
+
+class RuleError(ValueError):
+    """Nieprawidłowa definicja reguły."""
+
+
+def _threshold(value: Any) -> Callable[[str], Any]:
+    if isinstance(value, dict):
+        default = value.get("default")
+        per_loc = {str(k): v for k, v in value.items() if k != "default"}
+        return lambda loc: per_loc.get(loc, default)
+    return lambda loc: value
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _numeric_threshold(value: Any) -> Callable[[str], Any]:
+    """Próg liczbowy albo obiekt progów per lokalizacja — sprawdzany przy kompilacji, nie przy ocenie."""
+    values = list(value.values()) if isinstance(value, dict) else [value]
+    if not values or not all(_is_number(v) for v in values):
+        raise RuleError(f"Próg musi być liczbą (lub obiektem liczb per lokalizacja): {value!r}")
+    return _threshold(value)
+
+
+def _min_run(flags: List[bool], n: int) -> List[bool]:
+    """Zostaw True tylko w ciągach o długości >= n."""
+    out = [False] * len(flags)
+    run_start = None
+    for i, f in enumerate(flags + [False]):
+        if f and run_start is None:
+            run_start = i
+        elif not f and run_start is not None:
+            if i - run_start >= n:
+                out[run_start:i] = [True] * (i - run_start)
+            run_start = None
+    return out
+
+
+def _context(cond: Dict[str, Any]) -> int:
+    """Ile godzin sąsiednich (w każdą stronę) wpływa na wynik warunku w danej godzinie."""
+    if "all" in cond or "any" in cond:
+        ctx = max(_context(c) for c in cond["all" if "all" in cond else "any"])
+    elif "not" in cond:
+        ctx = _context(cond["not"])
+    else:
+        ctx = int(cond.get("over_hours") or 1) if "change" in cond else 0
+    n = int(cond.get("for_hours") or 0)
+    return ctx + max(n - 1, 0)
+
+
+def _compile(cond: Dict[str, Any]) -> Predicate:
+    if not isinstance(cond, dict):
+        raise RuleError(f"Warunek musi być obiektem: {cond!r}")
+    pred = _compile_inner(cond)
+    n = int(cond.get("for_hours") or 0)
+    if n > 1:
+        inner = pred
+        pred = lambda cols, loc: _min_run(inner(cols, loc), n)
+    return pred
+
+
+def _compile_inner(cond: Dict[str, Any]) -> Predicate:
+    if "all" in cond or "any" in cond:
+        key = "all" if "all" in cond else "any"
+        parts = [_compile(c) for c in cond[key]]
+        if not parts:
+            raise RuleError(f"Pusta lista w '{key}'")
+        combine = all if key == "all" else any
+
+        def pred(cols: Columns, loc: str) -> List[bool]:
+            return [combine(t) for t in zip(*(p(cols, loc) for p in parts))]
+        return pred
+    if "not" in cond:
+        inner = _compile(cond["not"])
+        return lambda cols, loc: [not f for f in inner(cols, loc)]
+
+    var = cond.get("var")
+    if var not in VARIABLES:
+        raise RuleError(f"Nieznana zmienna '{var}' (dostępne: {', '.join(VARIABLES)})")
+
+    if "change" in cond:
+        op = _OPS.get(cond["change"])
+        if op is None:
+            raise RuleError(f"Nieznany operator zmiany '{cond['change']}'")
+        thr = _numeric_threshold(cond.get("value"))
+        k = int(cond.get("over_hours") or 1)
+
+        def pred(cols: Columns, loc: str) -> List[bool]:
+            col = cols[var]
+            t = thr(loc)
+            if t is None:
+                return [False] * len(col)
+            return [False] * min(k, len(col)) + [
+                a is not None and b is not None and op(a - b, t) for a, b in zip(col[k:], col)]
+        return pred
+
+    op_name = cond.get("op")
+    if op_name == "in":
+        value = cond.get("value")
+        lists = value.values() if isinstance(value, dict) else [value]
+        if not all(isinstance(v, (list, tuple)) for v in lists):
+            raise RuleError(f"Operator 'in' wymaga listy (lub obiektu list per lokalizacja): {value!r}")
+        sets = _threshold({k: set(v) for k, v in value.items()} if isinstance(value, dict) else set(value))
+
+        def pred(cols: Columns, loc: str) -> List[bool]:
+            allowed = sets(loc) or ()
+            return [v is not None and v in allowed for v in cols[var]]
+        return pred
+    op = _OPS.get(op_name)
+    if op is None:
+        raise RuleError(f"Nieznany operator '{op_name}'")
+    thr = _numeric_threshold(cond.get("value"))
+
+    def pred(cols: Columns, loc: str) -> List[bool]:
+        t = thr(loc)
+        if t is None:
+            return [False] * len(cols[var])
+        return [v is not None and op(v, t) for v in cols[var]]
+    return pred
+
+
+class Rule:
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict) or "when" not in spec:
+            raise RuleError(f"Reguła bez 'when': {spec!r}")
+        if not isinstance(spec["when"], dict):
+            raise RuleError(f"Warunek musi być obiektem: {spec['when']!r}")
+        self.name = spec.get("name") or "rule"
+        self.message = spec.get("message") or self.name
+        self.report = spec.get("report") or spec["when"].get("var")
+        self.agg = spec.get("agg") or "max"
+        if self.agg not in _AGGS:
+            raise RuleError(f"Nieznana agregacja '{self.agg}'")
+        # część komunikatu pomijana, gdy zagregowana wartość <= 0 (np. opady tylko z kodu pogody)
+        self.report_nonzero = bool(spec.get("report_nonzero"))
+        self.locations = {str(x) for x in spec["locations"]} if spec.get("locations") else None
+        when = dict(spec["when"])
+        if spec.get("for_hours"):
+            when = {"all": [when], "for_hours": spec["for_hours"]}
+        self.predicate = _compile(when)
+        self.context_hours = _context(when)
+        if self.report is not None and self.report not in VARIABLES:
+            raise RuleError(f"Nieznana zmienna raportu '{self.report}'")
+
+    def applies_to(self, loc: str) -> bool:
+        return self.locations is None or loc in self.locations
+
+    def summarize(self, cols: Columns, idx: Iterable[int]) -> Optional[float]:
+        """Zagregowana wartość zmiennej raportu na wskazanych godzinach (None = brak danych)."""
+        if self.report is None:
+            return None
+        col = cols[self.report]
+        vals = [float(col[i]) for i in idx if col[i] is not None]
+        if not vals:
+            return None
+        return float(_AGGS[self.agg](vals))
+
+    def render(self, value: Optional[float]) -> Optional[str]:
+        if self.report_nonzero and not value:
+            return None
+        try:
+            return self.message.format(value=value if value is not None else float("nan"))
+        except (ValueError, KeyError, IndexError):
+            return self.message
+
+
+class RuleSet:
+    def __init__(self, rules: Sequence[Rule], signature: str = ""):
+        self.rules = list(rules)
+        # odcisk definicji — zmiana reguł wymusza pełną ponowną ocenę (Alert.analyze_changes)
+        self.signature = signature
+        self.context_hours = max((r.context_hours for r in self.rules), default=0)
+
+    def evaluate(self, cols: Columns, location_id: Any, mask: Optional[List[bool]] = None) -> List[List[bool]]:
+        """Flagi [reguła][godzina] dla jednej lokalizacji; `mask` wyłącza godziny (np. poza horyzontem)."""
+        loc = str(location_id)
+        n = len(cols.get("time", ()))
+        out = []
+        for rule in self.rules:
+            if not rule.applies_to(loc):
+                out.append([False] * n)
+                continue
+            flags = rule.predicate(cols, loc)
+            if mask is not None:
+                flags = [f and m for f, m in zip(flags, mask)]
+            out.append(flags)
+        return out
+
+    def evaluate_all(self, data: Dict[Any, Columns],
+                     location_of: Callable[[Any], Any] = lambda key: key) -> Dict[Any, List[List[bool]]]:
+        """Jeden przebieg po danych wielu lokalizacji (albo ich okien — `location_of` daje lokalizację klucza)."""
+        return {key: self.evaluate(cols, location_of(key)) for key, cols in data.items()}
+
+
+def compile_rules(specs: Iterable[Dict[str, Any]]) -> RuleSet:
+    specs = list(specs)
+    raw = json.dumps(specs, sort_keys=True, default=str)
+    return RuleSet([Rule(s) for s in specs], signature=hashlib.sha1(raw.encode("utf-8")).hexdigest())
+
+
+def default_rule_specs(temp_low: float, wind: float, precip_codes: Iterable[int]) -> List[Dict[str, Any]]:
+    """Reguły odpowiadające dotychczasowym progom z Alert.py."""
+    return [
+        {"name": "temp_low", "when": {"var": "temperature", "op": "<", "value": temp_low},
+         "message": "temperatura do {value:.0f}°C", "report": "temperature", "agg": "min"},
+        {"name": "wind", "when": {"var": "wind_speed", "op": ">", "value": wind},
+         "message": "wiatr do {value:.0f} m/s", "report": "wind_speed", "agg": "max"},
+        {"name": "precip", "when": {"any": [{"var": "rain", "op": ">", "value": 0},
+                                            {"var": "snowfall", "op": ">", "value": 0},
+                                            {"var": "weather_code", "op": "in", "value": sorted(precip_codes)}]},
+         "message": "opady (deszcz/śnieg)", "report": "precip", "agg": "sum", "report_nonzero": True},
+    ]
+
+
+def to_columns(times: List[str], temps: List[Any], rains: List[Any], snows: List[Any],
+               winds: List[Any], codes: List[Any]) -> Columns:
+    """Kolumny wyrównane do `times` (braki -> None), z konwersją typów jak w dotychczasowej analizie."""
+    n = len(times)
+
+    def num(col: List[Any], conv=float) -> List[Any]:
+        out = []
+        for i in range(n):
+            v = col[i] if i < len(col) else None
+            try:
+                out.append(conv(v) if v is not None else None)
+            except (TypeError, ValueError):
+                out.append(None)
+        return out
+
+    rain = num(rains)
+    snow = num(snows)
+    return {
+        "time": list(times),
+        "temperature": num(temps),
+        "rain": rain,
+        "snowfall": snow,
+        "wind_speed": num(winds),
+        "weather_code": num(codes, int),
+        "precip": [(r or 0.0) + (s or 0.0) if (r is not None or s is not None) else None
+                   for r, s in zip(rain, snow)],
+    }
@@ -0,0 +1,328 @@
+"""Harmonogram trybu ciągłego (zastępuje pętlę `while True: ...; time.sleep(...)`).
+
+- ticki wyrównane do zegara ściennego (np. co 15 min: :00, :15, :30, :45), więc cykle
+  nie dryfują o czas własnego wykonania,
+- lokalizacje rozłożone w obrębie interwału (stały slot + losowy jitter),
+- dane niezmienione od poprzedniego pobrania (ten sam odcisk payloadu) nie są
+  zapisywane ani analizowane ponownie, a lokalizacja jest odpytywana rzadziej,
+- etapy nakładają się: backup DB biegnie równolegle z pobieraniem, a zapis i analiza
+  alertów lokalizacji N — równolegle z pobieraniem lokalizacji N+1.
+
+Po każdym ticku logowane są metryki: spóźnienie (lateness) i liczba pominiętych prac.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import Alert
+import metrics
+import profiler
+from Api import DB_PATH, _ensure_db, _store_hourly, fetch_location, payload_fingerprint
+from backup_db import backup_db
+
+LOGGER = logging.getLogger("meteofetch.scheduler")
+
+TICK_LATENESS = metrics.gauge("meteofetch_tick_lateness_seconds", "Spóźnienie startu ostatniego ticku")
+TICK_DURATION = metrics.histogram("meteofetch_tick_seconds", "Czas trwania ticku",
+                                  buckets=(1, 5, 15, 30, 60, 120, 300, 600, 900))
+TICK_SKIPPED = metrics.counter("meteofetch_tick_skipped", "Pominięte pobrania lokalizacji", ("reason",))
+TICKS = metrics.counter("meteofetch_ticks", "Wykonane ticki")
+
+
+def next_aligned(now: float, interval_s: float) -> float:
+    """Najbliższa chwila (epoch) będąca wielokrotnością interwału, ściśle po `now`."""
+    return (int(now // interval_s) + 1) * interval_s
+
+
+@dataclass
+class LocationState:
+    """Stan harmonogramu jednej lokalizacji."""
+    fingerprint: Optional[str] = None
+    unchanged_streak: int = 0
+    next_due: float = 0.0   # epoch najbliższego ticku, w którym lokalizacja ma być odpytana
+
+
+@dataclass
+class TickStats:
+    """Metryki jednego ticku."""
+    tick: float
+    lateness_s: float = 0.0          # spóźnienie startu ticku względem zegara
+    max_fetch_lateness_s: float = 0.0  # największe spóźnienie względem slotu lokalizacji
+    fetched: int = 0
+    inserted: int = 0
+    alerts: int = 0
+    skipped_not_due: int = 0         # lokalizacje pominięte (backoff po niezmienionych danych)
+    skipped_unchanged: int = 0       # pobrane, ale dane identyczne -> bez zapisu i analizy
+    errors: int = 0
+    duration_s: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+class Scheduler:
+    def __init__(self, locations: List[Dict[str, Any]], interval_min: int = 15,
+                 fetch_hourly: bool = True, save_json: bool = False,
+                 spread: float = 0.5, jitter_s: float = 10.0, max_backoff: int = 4,
+                 backup_keep: int = 7, db_path: str = DB_PATH,
+                 clock: Callable[[], float] = time.time, sleep: Optional[Callable[[float], None]] = None,
+                 on_tick: Optional[Callable[["TickStats"], None]] = None):
+        """
+        - spread: jaka część interwału służy do rozłożenia lokalizacji (0 = wszystkie naraz),
+        - jitter_s: maks. losowe przesunięcie slotu lokalizacji (sekundy),
+        - max_backoff: maks. liczba ticków pomijanych po kolejnych niezmienionych payloadach,
+        - on_tick: wywoływane po każdym ticku (np. zapis pliku metryk przez demona),
+        - sleep: drzemka między slotami (np. z fałszywym zegarem); domyślnie czekanie na
+          trigger()/stop(), które budzi od razu.
+        """
+        self.locations = list(locations)
+        self.interval_s = float(interval_min) * 60.0
+        self.fetch_hourly = fetch_hourly
+        self.save_json = save_json
+        self.spread = min(max(spread, 0.0), 0.9)
+        self.jitter_s = max(jitter_s, 0.0)
+        self.max_backoff = max(max_backoff, 0)
+        self.backup_keep = backup_keep
+        self.db_path = db_path
+        self.clock = clock
+        self.sleep = sleep
+        self.on_tick = on_tick
+        self._metrics_snapshot = metrics.REGISTRY.snapshot()
+        self.state: Dict[Any, LocationState] = {loc["id"]: LocationState() for loc in self.locations}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pending_locations: Optional[List[Dict[str, Any]]] = None
+        self.last_stats: Optional[TickStats] = None
+        self.ticks = 0
+        self.next_tick: Optional[float] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        # osobne wątki: backup oraz etap DB (zapis + alerty); jeden wątek DB = jeden writer
+        self._backup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+        self._db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+    # --- sloty ---
+    def slot_offset(self, index: int) -> float:
+        """Przesunięcie (s) lokalizacji o danym indeksie względem startu ticku."""
+        n = max(len(self.locations), 1)
+        base = (index / n) * self.interval_s * self.spread
+        jitter = random.uniform(0.0, self.jitter_s) if self.jitter_s else 0.0
+        return min(base + jitter, self.interval_s * 0.95)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self) -> None:
+        """Wymuś natychmiastowy tick (np. z interfejsu kontrolnego demona)."""
+        self._wake.set()
+
+    def update_locations(self, locations: List[Dict[str, Any]]) -> None:
+        """Podmień listę lokalizacji; zmiana wchodzi w życie na początku kolejnego ticku."""
+        with self._lock:
+            self._pending_locations = list(locations)
+
+    def _apply_pending_locations(self) -> None:
+        with self._lock:
+            pending, self._pending_locations = self._pending_locations, None
+        if pending is None:
+            return
+        # zachowaj stan (odcisk payloadu) lokalizacji, które zostały w konfiguracji
+        self.state = {loc["id"]: self.state.get(loc["id"]) or LocationState() for loc in pending}
+        self.locations = pending
+        LOGGER.info("Zaktualizowano listę lokalizacji (%d)", len(pending))
+
+    def _wait_until(self, when: float) -> bool:
+        """Czekaj do slotu; False, gdy przerwano przez stop() albo trigger()."""
+        while not self._stop.is_set() and not self._wake.is_set():
+            delay = when - self.clock()
+            if delay <= 0:
+                return True
+            # krótkie drzemki, żeby stop() działał szybko; Event.wait budzi się od razu
+            (self.sleep or self._wake.wait)(min(delay, 1.0))
+        return False
+
+    def _take_trigger(self) -> bool:
+        """trigger() w trakcie ticku: pozostałe lokalizacje od razu i bez backoffu, zamiast
+        czekać na ich sloty i dopiero po ticku robić osobny wymuszony tick."""
+        if self._stop.is_set() or not self._wake.is_set():
+            return False
+        self._wake.clear()
+        LOGGER.info("Wymuszony tick w trakcie ticku — pozostałe lokalizacje od razu")
+        return True
+
+    # --- etap DB (wątek "db") ---
+    def _db_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            _ensure_db()
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def _store_and_alert(self, loc: Dict[str, Any], payload: Dict[str, Any],
+                         backup_done: Future) -> tuple[int, int]:
+        # zapis dopiero po zakończeniu kopii — backup nie może widzieć połowy transakcji
+        try:
+            backup_done.result()
+        except Exception:
+            LOGGER.warning("Backup DB nieudany.")
+        conn = self._db_conn()
+        inserted = _store_hourly(conn, loc["id"], payload)
+        # tylko godziny zmienione przez ten zapis (changes.py) + przesunięcie horyzontu
+        alerts = Alert.analyze_changes(conn, [loc])
+        return inserted, alerts
+
+    def _advance_alerts(self, loc: Dict[str, Any], backup_done: Future) -> tuple[int, int]:
+        """Lokalizacja bez zapisu w tym ticku: ocena tylko godzin, które weszły do horyzontu alertów."""
+        try:
+            backup_done.result()
+        except Exception:
+            pass
+        return 0, Alert.analyze_changes(self._db_conn(), [loc])
+
+    def _backup(self) -> Optional[str]:
+        return backup_db(self.db_path, keep=self.backup_keep)
+
+    # --- tick ---
+    def run_tick(self, tick: float, force: bool = False) -> TickStats:
+        """Wykonaj jeden tick; force=True ignoruje backoff lokalizacji z niezmienionymi danymi."""
+        self._apply_pending_locations()
+        profiling = profiler.PROFILER.begin_cycle()
+        try:
+            return self._run_tick(tick, force)
+        finally:
+            if profiling:
+                profiler.PROFILER.end_cycle(label="tick")
+
+    def _run_tick(self, tick: float, force: bool) -> TickStats:
+        started = self.clock()
+        stats = TickStats(tick=tick, lateness_s=max(started - tick, 0.0))
+        t_backup = time.perf_counter()
+        backup_future = self._backup_pool.submit(self._backup)
+        backup_future.add_done_callback(
+            lambda _f: stats.stages.__setitem__("backup_s", time.perf_counter() - t_backup))
+
+        pending: List[Future] = []
+        idle: List[Dict[str, Any]] = []   # bez zapisu w tym ticku — horyzont alertów i tak się przesuwa
+        fetch_total = 0.0
+        for idx, loc in enumerate(self.locations):
+            if self._stop.is_set():
+                break
+            force = self._take_trigger() or force
+            st = self.state[loc["id"]]
+            if st.next_due > tick and not force:
+                stats.skipped_not_due += 1
+                idle.append(loc)
+                continue
+            # wymuszony tick nie rozkłada lokalizacji w czasie — ma być natychmiast
+            slot = tick if force else tick + self.slot_offset(idx)
+            if not self._wait_until(slot):
+                if self._stop.is_set():
+                    break
+                force = self._take_trigger()
+                slot = self.clock()
+            stats.max_fetch_lateness_s = max(stats.max_fetch_lateness_s, self.clock() - slot)
+            name = loc.get("name") or str(loc.get("id"))
+            t0 = time.perf_counter()
+            try:
+                payload = fetch_location(loc, fetch_hourly=self.fetch_hourly, save_json=self.save_json)
+            except Exception as e:
+                stats.errors += 1
+                LOGGER.exception("Błąd pobierania dla %s: %s", name, e)
+                idle.append(loc)
+                continue
+            finally:
+                fetch_total += time.perf_counter() - t0
+            stats.fetched += 1
+
+            fp = payload_fingerprint(payload)
+            if fp == st.fingerprint:
+                # ten sam przebieg modelu — nic nowego do zapisu ani do alertów
+                st.unchanged_streak += 1
+                skip = min(st.unchanged_streak, self.max_backoff)
+                # pomijamy `skip` kolejnych ticków, więc następne odpytanie za skip + 1
+                st.next_due = tick + (skip + 1) * self.interval_s
+                stats.skipped_unchanged += 1
+                idle.append(loc)
+                LOGGER.debug("Dane bez zmian dla %s, kolejne odpytanie za %d tick(ów)", name, skip + 1)
+                continue
+            st.fingerprint = fp
+            st.unchanged_streak = 0
+            st.next_due = 0.0
+            pending.append(self._db_pool.submit(self._store_and_alert, loc, payload, backup_future))
+        stats.stages["fetch_s"] = fetch_total
+        if not self._stop.is_set():
+            pending += [self._db_pool.submit(self._advance_alerts, loc, backup_future) for loc in idle]
+
+        t_db = time.perf_counter()
+        for fut in pending:
+            try:
+                inserted, alerts = fut.result()
+                stats.inserted += inserted
+                stats.alerts += alerts
+            except Exception:
+                stats.errors += 1
+                LOGGER.exception("Błąd zapisu/analizy alertów")
+        stats.stages["db_wait_s"] = time.perf_counter() - t_db
+        try:
+            backup_future.result()
+        except Exception:
+            pass
+        stats.duration_s = self.clock() - started
+        LOGGER.info(
+            "Tick %s: lateness=%.3fs max_slot_lateness=%.3fs fetched=%d inserted=%d alerts=%d "
+            "skipped(not_due=%d unchanged=%d) errors=%d duration=%.3fs",
+            time.strftime("%H:%M:%S", time.gmtime(tick)), stats.lateness_s, stats.max_fetch_lateness_s,
+            stats.fetched, stats.inserted, stats.alerts, stats.skipped_not_due,
+            stats.skipped_unchanged, stats.errors, stats.duration_s)
+        self.last_stats = stats
+        self.ticks += 1
+        TICKS.inc()
+        TICK_LATENESS.set(stats.lateness_s)
+        TICK_DURATION.observe(stats.duration_s)
+        TICK_SKIPPED.inc(stats.skipped_not_due, reason="not_due")
+        TICK_SKIPPED.inc(stats.skipped_unchanged, reason="unchanged")
+        snap = metrics.REGISTRY.snapshot()
+        LOGGER.info("Metryki cyklu: %s", metrics.format_summary(metrics.diff(self._metrics_snapshot, snap)))
+        self._metrics_snapshot = snap
+        if self.on_tick is not None:
+            try:
+                self.on_tick(stats)
+            except Exception:
+                LOGGER.exception("Błąd w on_tick")
+        return stats
+
+    def run_forever(self, run_immediately: bool = True) -> None:
+        """Pętla główna; pierwszy tick od razu (jeśli run_immediately), dalej wyrównane do zegara."""
+        LOGGER.info("Start schedulera co %d s dla %d lokalizacji", int(self.interval_s), len(self.locations))
+        try:
+            if run_immediately and not self._stop.is_set():
+                self.run_tick(self.clock())
+            while not self._stop.is_set():
+                tick = next_aligned(self.clock(), self.interval_s)
+                self.next_tick = tick
+                # czekamy do ticku albo do trigger(); wait() na Event budzi się od razu
+                while not self._stop.is_set() and not self._wake.is_set():
+                    delay = tick - self.clock()
+                    if delay <= 0:
+                        break
+                    self._wake.wait(min(delay, 1.0))
+                if self._stop.is_set():
+                    break
+                if self._wake.is_set():
+                    self._wake.clear()
+                    LOGGER.info("Wymuszony tick")
+                    self.run_tick(self.clock(), force=True)
+                    continue
+                self.run_tick(tick)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._backup_pool.shutdown(wait=True)
+        self._db_pool.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
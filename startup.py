@@ -0,0 +1,52 @@
+"""Pomiar czasu startu (time to first request) dla krótkich uruchomień `--once`.
+
+`Main.py` woła `mark_start()` jako pierwszą instrukcję; `Api._fetch_open_meteo` woła
+`first_request()` tuż przed pierwszym zapytaniem HTTP. Jeśli czas od startu przekroczy
+budżet (`STARTUP_BUDGET_MS`, flaga `--startup-budget-ms`), logujemy ostrzeżenie.
+
+Zmienna środowiskowa `METEOFETCH_STARTUP_PROBE=1` kończy proces w chwili pierwszego
+zapytania i wypisuje zmierzony czas na stderr (używa tego `benchmarks/bench_startup.py`,
+żeby mierzyć start bez dostępu do sieci).
+"""
+import logging
+import os
+import sys
+import time
+
+LOGGER = logging.getLogger("meteofetch.startup")
+
+STARTUP_BUDGET_MS = 250.0
+PROBE_ENV = "METEOFETCH_STARTUP_PROBE"
+
+_t0: float | None = None
+_first_request_ms: float | None = None
+
+
+def mark_start(budget_ms: float | None = None) -> None:
+    global _t0, STARTUP_BUDGET_MS
+    if _t0 is None:
+        _t0 = time.perf_counter()
+    if budget_ms is not None:
+        STARTUP_BUDGET_MS = float(budget_ms)
+
+
+def first_request() -> float | None:
+    """Zanotuj (jednorazowo) czas do pierwszego zapytania; zwraca ms lub None."""
+    global _first_request_ms
+    if _t0 is None or _first_request_ms is not None:
+        return _first_request_ms
+    _first_request_ms = (time.perf_counter() - _t0) * 1000.0
+    if os.environ.get(PROBE_ENV):
+        sys.stderr.write(f"startup_first_request_ms={_first_request_ms:.2f}\n")
+        sys.stderr.flush()
+        os._exit(0)
+    if _first_request_ms > STARTUP_BUDGET_MS:
+        LOGGER.warning("Start do pierwszego zapytania: %.1f ms (budżet %.0f ms)",
+                       _first_request_ms, STARTUP_BUDGET_MS)
+    else:
+        LOGGER.info("Start do pierwszego zapytania: %.1f ms", _first_request_ms)
+    return _first_request_ms
+
+
+def first_request_ms() -> float | None:
+    return _first_request_ms
@@ -0,0 +1,149 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import Alert
+import Api
+
+HOUR = timedelta(hours=1)
+BASE = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+
+class Clock:
+    """Zegar analizy alertów (Alert.datetime.utcnow) ustawiany w teście."""
+    now = BASE + timedelta(minutes=30)
+
+
+class FakeDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return Clock.now
+
+
+LOC = {"id": 1, "name": "Zugspitze"}
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(Api, "DB_PATH", str(tmp_path / "data.db"))
+    monkeypatch.setattr(Alert, "datetime", FakeDatetime)
+    monkeypatch.setattr(Clock, "now", BASE + timedelta(minutes=30))
+    Alert.configure_alerts(None)
+    Api._ensure_db()
+    c = sqlite3.connect(Api.DB_PATH)
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    out = []
+    monkeypatch.setattr(Alert, "_notify_alert", lambda *a: out.append((a[2], a[3], a[6])))
+    return out
+
+
+def ts(h: int) -> str:
+    return (BASE + h * HOUR).strftime("%Y-%m-%dT%H:00")
+
+
+def store(conn, windy_hours, hours: int = 72) -> None:
+    """Prognoza na `hours` godzin od BASE + 1h; wiatr ponad próg w `windy_hours`."""
+    rng = range(1, hours + 1)
+    payload = {"hourly": {"time": [ts(h) for h in rng],
+                          "temperature_2m": [0.0] * len(rng), "rain": [0.0] * len(rng),
+                          "snowfall": [0.0] * len(rng), "weathercode": [0] * len(rng),
+                          "wind_speed_10m": [50.0 if h in windy_hours else 5.0 for h in rng]}}
+    Api._store_hourly(conn, LOC["id"], payload)
+
+
+def blocks(conn, open_only: bool = True):
+    sql = "SELECT timestamp, end_timestamp FROM alerts" + (" WHERE closed_at IS NULL" if open_only else "")
+    return sorted(conn.execute(sql).fetchall())
+
+
+def test_new_block(conn, sent):
+    store(conn, range(5, 9))
+    assert Alert.analyze_changes(conn, [LOC]) == 1
+    assert blocks(conn) == [(ts(5), ts(8))]
+    assert sent == [(ts(5), ts(8), "new")]
+    # bez nowych danych: nic do oceny, nic do zgłoszenia
+    assert Alert.analyze_changes(conn, [LOC]) == 0
+    assert len(sent) == 1
+
+
+def test_extend(conn, sent):
+    store(conn, range(5, 9))
+    Alert.analyze_changes(conn, [LOC])
+    store(conn, range(5, 12))
+    assert Alert.analyze_changes(conn, [LOC]) == 0
+    assert blocks(conn, open_only=False) == [(ts(5), ts(11))]
+    assert sent[-1] == (ts(5), ts(11), "extended")
+
+
+def test_split(conn, sent):
+    store(conn, range(5, 12))
+    Alert.analyze_changes(conn, [LOC])
+    store(conn, set(range(5, 12)) - {8})
+    assert Alert.analyze_changes(conn, [LOC]) == 1
+    assert blocks(conn) == [(ts(5), ts(7)), (ts(9), ts(11))]
+    assert sent[-1] == (ts(9), ts(11), "new")
+
+
+def test_close(conn, sent):
+    store(conn, range(5, 9))
+    Alert.analyze_changes(conn, [LOC])
+    store(conn, ())
+    assert Alert.analyze_changes(conn, [LOC]) == 0
+    assert blocks(conn) == []
+    assert conn.execute("SELECT COUNT(*) FROM alerts WHERE closed_at IS NOT NULL").fetchone()[0] == 1
+    assert len(sent) == 1
+
+
+def test_horizon_advance_adds_block(conn, sent):
+    # godziny 50-52 są poza 2-dniowym horyzontem, dopóki zegar się nie przesunie
+    store(conn, range(50, 53))
+    assert Alert.analyze_changes(conn, [LOC]) == 0
+    Clock.now += 5 * HOUR
+    assert Alert.analyze_changes(conn, [LOC]) == 1
+    assert blocks(conn) == [(ts(50), ts(52))]
+    assert sent == [(ts(50), ts(52), "new")]
+
+
+def test_horizon_advance_does_not_renotify(conn, sent):
+    # blok sięga końca horyzontu i rośnie tylko dlatego, że horyzont się przesuwa
+    store(conn, range(46, 60))
+    Alert.analyze_changes(conn, [LOC])
+    assert blocks(conn) == [(ts(46), ts(48))]
+    for step in range(1, 4):
+        Clock.now += HOUR
+        assert Alert.analyze_changes(conn, [LOC]) == 0
+        assert blocks(conn) == [(ts(46), ts(48 + step))]
+    assert sent == [(ts(46), ts(48), "new")]
+
+
+def test_pre_migration_rows(tmp_path, monkeypatch, sent):
+    path = str(tmp_path / "old.db")
+    monkeypatch.setattr(Api, "DB_PATH", path)
+    monkeypatch.setattr(Alert, "datetime", FakeDatetime)
+    monkeypatch.setattr(Clock, "now", BASE + timedelta(minutes=30))
+    Alert.configure_alerts(None)
+    old = sqlite3.connect(path)
+    # schemat sprzed bloków alertów: jeden wiersz na początek bloku, bez końca i zamknięcia
+    old.execute("CREATE TABLE alerts (id INTEGER PRIMARY KEY AUTOINCREMENT, location_id INTEGER, timestamp TEXT, "
+                "metric TEXT, value REAL, message TEXT, origin TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)")
+    old.execute("INSERT INTO alerts (location_id, timestamp, metric, value, message, origin) "
+                "VALUES (1, ?, 'combined', 50, 'stary komunikat', 'detected')", (ts(5),))
+    old.commit()
+    old.close()
+    Api._ensure_db()
+    conn = sqlite3.connect(path)
+    try:
+        assert blocks(conn) == [(ts(5), ts(5))]
+        store(conn, range(5, 9))
+        assert Alert.analyze_changes(conn, [LOC]) == 0
+        # ten sam blok rozciągnięty do faktycznego zakresu — bez duplikatu i bez powiadomienia
+        assert blocks(conn, open_only=False) == [(ts(5), ts(8))]
+        assert sent == []
+    finally:
+        conn.close()
@@ -0,0 +1,77 @@
+import pytest
+
+import rules
+
+
+def cols(**kw):
+    n = len(next(iter(kw.values())))
+    out = {"time": [f"2026-01-01T{h:02d}:00" for h in range(n)]}
+    for var in rules.VARIABLES:
+        out[var] = kw.get(var, [None] * n)
+    return out
+
+
+def flags(spec, data, loc=1):
+    return rules.compile_rules([spec]).evaluate(data, loc)[0]
+
+
+def test_comparison_and_for_hours():
+    data = cols(wind_speed=[40, 40, 10, 40, 40, 40])
+    assert flags({"when": {"var": "wind_speed", "op": ">", "value": 35}}, data) == [True, True, False, True, True, True]
+    assert flags({"when": {"var": "wind_speed", "op": ">", "value": 35}, "for_hours": 3}, data) == \
+        [False, False, False, True, True, True]
+
+
+def test_change_and_combinations():
+    data = cols(temperature=[0, -2, -9, -9, -1], wind_speed=[0, 0, 50, 0, 0])
+    drop = {"var": "temperature", "change": "<=", "value": -5, "over_hours": 2}
+    assert flags({"when": drop}, data) == [False, False, True, True, False]
+    assert flags({"when": {"all": [drop, {"var": "wind_speed", "op": ">", "value": 35}]}}, data) == \
+        [False, False, True, False, False]
+    assert flags({"when": {"not": drop}}, data) == [True, True, False, False, True]
+
+
+def test_per_location_threshold_and_in():
+    data = cols(temperature=[-12, -18], weather_code=[61, 3])
+    spec = {"when": {"var": "temperature", "op": "<", "value": {"default": -15, "1": -10}}}
+    assert flags(spec, data, loc=1) == [True, True]
+    assert flags(spec, data, loc=2) == [False, True]
+    assert flags({"when": {"var": "weather_code", "op": "in", "value": [61, 63]}}, data) == [True, False]
+
+
+def test_rules_limited_to_locations():
+    ruleset = rules.compile_rules([{"when": {"var": "rain", "op": ">", "value": 0}, "locations": [2]}])
+    data = cols(rain=[1.0])
+    assert ruleset.evaluate(data, 1) == [[False]]
+    assert ruleset.evaluate_all({1: data, 2: data}) == {1: [[False]], 2: [[True]]}
+
+
+def test_signature_and_context():
+    a = rules.compile_rules([{"when": {"var": "rain", "op": ">", "value": 0}, "for_hours": 3}])
+    b = rules.compile_rules([{"when": {"var": "rain", "op": ">", "value": 1}, "for_hours": 3}])
+    assert a.signature != b.signature
+    assert a.context_hours == 2
+    assert rules.compile_rules([{"when": {"var": "temperature", "change": "<", "value": -5,
+                                          "over_hours": 3}}]).context_hours == 3
+
+
+@pytest.mark.parametrize("spec", [
+    {"name": "bez when"},
+    {"when": {"var": "humidity", "op": ">", "value": 1}},
+    {"when": {"var": "wind_speed", "op": "=>", "value": 1}},
+    {"when": {"var": "wind_speed", "op": ">", "value": "35"}},
+    {"when": {"var": "wind_speed", "op": ">"}},
+    {"when": {"var": "wind_speed", "op": ">", "value": True}},
+    {"when": {"var": "wind_speed", "op": ">", "value": {"default": "x"}}},
+    {"when": {"var": "wind_speed", "op": ">", "value": {}}},
+    {"when": {"var": "temperature", "change": "<", "over_hours": 2}},
+    {"when": {"var": "temperature", "change": "~", "value": 1}},
+    {"when": {"var": "weather_code", "op": "in", "value": 61}},
+    {"when": {"any": []}},
+    {"when": ["wind_speed"]},
+    {"when": {"var": "rain", "op": ">", "value": 0}, "agg": "median"},
+    {"when": {"var": "rain", "op": ">", "value": 0}, "report": "humidity"},
+])
+def test_compile_errors(spec):
+    with pytest.raises(rules.RuleError):
+        rules.compile_rules([spec])